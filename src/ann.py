@@ -0,0 +1,179 @@
+import os
+import numpy as np
+
+ENCODING_DIM = 128
+INDEX_FILENAME = '.ivf.npz'
+
+# Below this many encodings a brute-force scan is both exact and fast enough
+ANN_MIN_GALLERY = 20000
+
+
+def _sq_distances(queries, points, point_sq_norms=None):
+    """Squared Euclidean distances (Q, P) via the ||q||^2 + ||p||^2 - 2q.p expansion."""
+    if point_sq_norms is None:
+        point_sq_norms = np.einsum('ij,ij->i', points, points)
+    q_sq = np.einsum('ij,ij->i', queries, queries)
+    sq = q_sq[:, None] + point_sq_norms[None, :] - 2.0 * (queries @ points.T)
+    return np.maximum(sq, 0, out=sq)
+
+
+def _nearest(points, centroids, chunk_size=65536):
+    """Index of the nearest centroid for every point, computed in chunks to bound memory."""
+    c_sq = np.einsum('ij,ij->i', centroids, centroids)
+    out = np.empty(len(points), dtype=np.int32)
+    for start in range(0, len(points), chunk_size):
+        chunk = points[start:start + chunk_size]
+        out[start:start + chunk_size] = np.argmin(_sq_distances(chunk, centroids, c_sq), axis=1)
+    return out
+
+
+def kmeans(points, k, iterations=10, seed=0):
+    """Plain Lloyd's k-means in NumPy. Returns a (k, D) float32 centroid matrix."""
+    rng = np.random.default_rng(seed)
+    points = np.asarray(points, dtype=np.float32)
+    centroids = points[rng.choice(len(points), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _nearest(points, centroids)
+        counts = np.bincount(assign, minlength=k)
+        nonempty = counts > 0
+        # Sum each cluster with one reduceat over the points sorted by cluster
+        order = np.argsort(assign, kind='stable')
+        starts = (np.cumsum(counts) - counts)[nonempty]
+        sums = np.add.reduceat(points[order], starts, axis=0)
+        centroids[nonempty] = sums / counts[nonempty, None]
+        # Re-seed empty clusters from random points
+        empty = np.flatnonzero(~nonempty)
+        if len(empty) > 0:
+            centroids[empty] = points[rng.choice(len(points), size=len(empty), replace=False)]
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file index over the rows of a Matcher gallery.
+
+    A k-means coarse quantizer splits the gallery into n_lists cells; a query
+    only scans the rows of its n_probe nearest cells and the Matcher re-ranks
+    that shortlist exactly. n_probe is the recall/latency knob: more probes
+    mean higher recall and a longer shortlist.
+    """
+    def __init__(self, n_lists=1024, n_probe=16, kmeans_iterations=10, train_sample=256):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.kmeans_iterations = kmeans_iterations
+        self.train_sample = train_sample
+        self.centroids = None
+        self._lists = []
+        self._arrays = []
+        self._assign = np.empty(0, dtype=np.int32)
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    def train(self, vectors, seed=0):
+        """Fits the coarse quantizer on a sample of at most train_sample points per list."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n_lists = min(self.n_lists, len(vectors))
+        sample_size = min(len(vectors), n_lists * self.train_sample)
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(len(vectors), size=sample_size, replace=False)]
+        self.n_lists = n_lists
+        self.centroids = kmeans(sample, n_lists, iterations=self.kmeans_iterations, seed=seed)
+        self.reset()
+
+    def reset(self):
+        """Empties the inverted lists but keeps the trained centroids."""
+        self._lists = [[] for _ in range(self.n_lists)]
+        self._arrays = [None] * self.n_lists
+        self._assign = np.empty(0, dtype=np.int32)
+
+    def add(self, rows, vectors):
+        """Assigns gallery rows to their nearest cell."""
+        rows = np.asarray(rows, dtype=np.int64).reshape(-1)
+        if len(rows) == 0:
+            return
+        cells = _nearest(np.asarray(vectors, dtype=np.float32).reshape(-1, ENCODING_DIM), self.centroids)
+        needed = int(rows.max()) + 1
+        if needed > len(self._assign):
+            grown = np.full(max(needed, 2 * len(self._assign)), -1, dtype=np.int32)
+            grown[:len(self._assign)] = self._assign
+            self._assign = grown
+        self._assign[rows] = cells
+        for row, cell in zip(rows.tolist(), cells.tolist()):
+            self._lists[cell].append(row)
+            self._arrays[cell] = None
+
+    def remove(self, row):
+        cell = int(self._assign[row])
+        self._lists[cell].remove(row)
+        self._arrays[cell] = None
+        self._assign[row] = -1
+
+    def move(self, src, dst):
+        """Relabels gallery row src as dst (the Matcher swaps the last row into removed slots)."""
+        cell = int(self._assign[src])
+        members = self._lists[cell]
+        members[members.index(src)] = dst
+        self._arrays[cell] = None
+        self._assign[dst] = cell
+        self._assign[src] = -1
+
+    def _cell_rows(self, cell):
+        rows = self._arrays[cell]
+        if rows is None:
+            rows = np.array(self._lists[cell], dtype=np.intp)
+            self._arrays[cell] = rows
+        return rows
+
+    def shortlist(self, queries, n_probe=None):
+        """Candidate gallery rows for each query: the members of its n_probe nearest cells."""
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        cell_dist = _sq_distances(queries, self.centroids)
+        if n_probe < self.n_lists:
+            probes = np.argpartition(cell_dist, n_probe - 1, axis=1)[:, :n_probe]
+        else:
+            probes = np.broadcast_to(np.arange(self.n_lists), cell_dist.shape)
+        return [np.concatenate([self._cell_rows(c) for c in cells]) for cells in probes]
+
+    def save(self, path):
+        """Saves the trained quantizer. Lists are rebuilt from the gallery on load."""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, centroids=self.centroids, n_probe=self.n_probe)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            centroids = data['centroids']
+            index = cls(n_lists=len(centroids), n_probe=int(data['n_probe']))
+        index.centroids = centroids.astype(np.float32)
+        index.reset()
+        return index
+
+
+def attach_index(matcher, db_path, min_gallery=ANN_MIN_GALLERY, **params):
+    """
+    Gives a large gallery an IVF index, loading the quantizer saved next to the
+    images or training and saving a new one. Small galleries stay brute force.
+    Returns the index or None.
+    """
+    if len(matcher) < min_gallery:
+        return None
+
+    path = os.path.join(db_path, INDEX_FILENAME)
+    index = None
+    if os.path.exists(path):
+        try:
+            index = IVFIndex.load(path)
+        except (OSError, KeyError, ValueError):
+            index = None
+    if index is None:
+        index = IVFIndex(**params)
+        index.train(matcher.matrix)
+        index.save(path)
+
+    matcher.set_index(index)
+    return index
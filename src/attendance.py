@@ -0,0 +1,194 @@
+import os
+import queue
+import sqlite3
+import datetime
+import argparse
+import threading
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+LEGACY_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M:%S.%f')
+
+
+def parse_timestamp(text):
+    for fmt in LEGACY_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, fmt)
+        except ValueError:
+            pass
+    return None
+
+
+class AttendanceStore:
+    """
+    SQLite attendance store in WAL mode. Punches are indexed by time and by
+    (person, time), so "recent N" and per-person queries never scan the history.
+    Safe to share between threads.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS attendance ('
+                               'id INTEGER PRIMARY KEY, name TEXT NOT NULL, ts TEXT NOT NULL)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_attendance_ts ON attendance(ts)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_attendance_name_ts ON attendance(name, ts)')
+
+    def record(self, name, when=None):
+        self.record_many([(name, when)])
+
+    def record_many(self, punches):
+        """Writes several (name, datetime or None for now) punches in one transaction."""
+        now = datetime.datetime.now()
+        rows = [(name, (when or now).strftime(TIMESTAMP_FORMAT)) for name, when in punches]
+        with self._lock, self._conn:
+            self._conn.executemany('INSERT INTO attendance (name, ts) VALUES (?, ?)', rows)
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [(name, datetime.datetime.strptime(ts, TIMESTAMP_FORMAT)) for name, ts in rows]
+
+    def recent(self, n=25):
+        """Newest n punches as (name, datetime), newest first."""
+        return self._query('SELECT name, ts FROM attendance ORDER BY ts DESC, id DESC LIMIT ?', (n,))
+
+    def for_person(self, name, start=None, end=None):
+        """Punches of one person, oldest first, optionally within [start, end)."""
+        start = (start or datetime.datetime.min).strftime(TIMESTAMP_FORMAT)
+        end = (end or datetime.datetime.max).strftime(TIMESTAMP_FORMAT)
+        return self._query('SELECT name, ts FROM attendance WHERE name = ? AND ts >= ? AND ts < ? ORDER BY ts',
+                           (name, start, end))
+
+    def between(self, start, end):
+        """All punches within [start, end), oldest first."""
+        return self._query('SELECT name, ts FROM attendance WHERE ts >= ? AND ts < ? ORDER BY ts',
+                           (start.strftime(TIMESTAMP_FORMAT), end.strftime(TIMESTAMP_FORMAT)))
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM attendance').fetchone()[0]
+
+    def import_log(self, log_path, batch_size=5000):
+        """
+        One-time import of a legacy name,timestamp log.txt. Returns
+        (imported, skipped) line counts.
+        """
+        imported = skipped = 0
+        batch = []
+        with open(log_path, 'r') as f:
+            for line in f:
+                parts = line.strip().rsplit(',', 1)
+                when = parse_timestamp(parts[1]) if len(parts) == 2 else None
+                if when is None:
+                    skipped += 1 if line.strip() else 0
+                    continue
+                batch.append((parts[0], when))
+                if len(batch) >= batch_size:
+                    self.record_many(batch)
+                    imported += len(batch)
+                    batch = []
+        if batch:
+            self.record_many(batch)
+            imported += len(batch)
+        return imported, skipped
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class AttendanceWriter(threading.Thread):
+    """
+    Non-blocking writer: submit() only enqueues, and the thread writes whatever
+    has accumulated in one transaction. A failed write (e.g. database is locked)
+    keeps its punches and is retried every retry_delay seconds together with
+    anything submitted since.
+    """
+    def __init__(self, store, on_written=None, retry_delay=1.0):
+        super().__init__(daemon=True)
+        self.store = store
+        self.on_written = on_written
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue()
+
+    def submit(self, name, when=None):
+        self._queue.put((name, when or datetime.datetime.now()))
+
+    def run(self):
+        batch = []
+        stopping = False
+        while True:
+            try:
+                # With a failed batch pending, wake up to retry it even if nothing new arrives
+                item = self._queue.get(timeout=self.retry_delay if batch else None)
+            except queue.Empty:
+                item = ()
+            while item is not None:
+                if item:
+                    batch.append(item)
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            stopping = stopping or item is None
+            if batch:
+                try:
+                    self.store.record_many(batch)
+                except sqlite3.Error as e:
+                    if stopping:
+                        print('Attendance writer: {} punches lost: {}'.format(len(batch), e), flush=True)
+                        return
+                    print('Attendance writer: {} punches kept for retry: {}'.format(len(batch), e), flush=True)
+                    continue
+                if self.on_written is not None:
+                    self.on_written(batch)
+                batch = []
+            if stopping:
+                return
+
+    def stop(self):
+        """Flushes pending punches and stops the thread."""
+        self._queue.put(None)
+        self.join(timeout=2.0)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def open_store(path):
+    """Shared AttendanceStore per database path."""
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = AttendanceStore(path)
+        return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Attendance store utilities.')
+    parser.add_argument('--db', default='./attendance.db')
+    sub = parser.add_subparsers(dest='command', required=True)
+    imp = sub.add_parser('import', help='import a legacy log.txt')
+    imp.add_argument('log', nargs='?', default='./log.txt')
+    rec = sub.add_parser('recent', help='print the most recent punches')
+    rec.add_argument('-n', type=int, default=25)
+    args = parser.parse_args()
+
+    store = AttendanceStore(args.db)
+    if args.command == 'import':
+        if not os.path.exists(args.log):
+            parser.error('{} does not exist'.format(args.log))
+        imported, skipped = store.import_log(args.log)
+        print('Imported {} punches from {} ({} malformed lines skipped)'.format(imported, args.log, skipped))
+    else:
+        for name, when in store.recent(args.n):
+            print('{},{}'.format(name, when.strftime(TIMESTAMP_FORMAT)))
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
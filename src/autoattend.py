@@ -0,0 +1,41 @@
+from collections import deque
+
+
+class ClockInDebouncer:
+    """
+    Turns the live recognition stream into clock-in events.
+
+    An identity is confirmed once it is seen confidently (distance within
+    max_distance and a best/second-best margin of at least min_margin) in k of
+    the last m recognition cycles. After a punch the person is suppressed for
+    cooldown seconds, so standing in front of the camera logs them once.
+    """
+    def __init__(self, k=3, m=5, min_margin=0.05, max_distance=0.5, cooldown=300.0):
+        self.k = k
+        self.min_margin = min_margin
+        self.max_distance = max_distance
+        self.cooldown = cooldown
+        self.history = deque(maxlen=m)
+        self.last_punch = {}
+
+    def observe(self, candidates, now):
+        """
+        Feeds one recognition cycle of (name, distance, margin) candidates.
+        Returns the names to clock in now.
+        """
+        confident = {name for name, distance, margin in candidates
+                     if name is not None and distance <= self.max_distance and margin >= self.min_margin}
+        self.history.append(confident)
+
+        events = []
+        for name in confident:
+            if now - self.last_punch.get(name, float('-inf')) < self.cooldown:
+                continue
+            if sum(name in seen for seen in self.history) >= self.k:
+                self.last_punch[name] = now
+                events.append(name)
+        return events
+
+    def suppress(self, name, now):
+        """Starts the cooldown for a punch recorded elsewhere (e.g. the clock-in button)."""
+        self.last_punch[name] = now
@@ -0,0 +1,155 @@
+import time
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import Future
+import numpy as np
+import dlib
+from face_recognition import api as fr_api
+
+CHIP_SIZE = 150
+CHIP_PADDING = 0.25
+
+BatchTiming = namedtuple('BatchTiming', ['faces', 'requests', 'wait', 'align', 'encode'])
+
+
+def align_faces(rgb_image, face_locations):
+    """
+    Landmarks + alignment for every face location, done once per face.
+    Returns 150x150 chips in the same order as face_locations.
+    """
+    if not face_locations:
+        return []
+    # Same 5-point model face_recognition.face_encodings uses by default
+    landmarks = fr_api._raw_face_landmarks(rgb_image, face_locations, model='small')
+    return [dlib.get_face_chip(rgb_image, shape, size=CHIP_SIZE, padding=CHIP_PADDING) for shape in landmarks]
+
+
+def encode_chips(chips, max_batch_size=64):
+    """Runs the descriptor network over aligned chips in batches of max_batch_size."""
+    encodings = []
+    for start in range(0, len(chips), max_batch_size):
+        batch = chips[start:start + max_batch_size]
+        try:
+            descriptors = fr_api.face_encoder.compute_face_descriptor(batch)
+        except TypeError:
+            # Older dlib builds only take one chip per call
+            descriptors = [fr_api.face_encoder.compute_face_descriptor(chip) for chip in batch]
+        encodings.extend(np.array(d) for d in descriptors)
+    return encodings
+
+
+def encode_batch(items, max_batch_size=64):
+    """
+    Encodes the faces of several images at once. items is a list of
+    (rgb_image, face_locations). Returns (list of encoding lists, BatchTiming).
+    """
+    start = time.perf_counter()
+    chips, counts = [], []
+    for rgb_image, face_locations in items:
+        aligned = align_faces(rgb_image, face_locations)
+        chips.extend(aligned)
+        counts.append(len(aligned))
+    aligned_at = time.perf_counter()
+
+    flat = encode_chips(chips, max_batch_size)
+    done = time.perf_counter()
+
+    results, offset = [], 0
+    for count in counts:
+        results.append(flat[offset:offset + count])
+        offset += count
+    return results, BatchTiming(len(chips), len(items), 0.0, aligned_at - start, done - aligned_at)
+
+
+class EncodeBatcher(threading.Thread):
+    """
+    Collects encoding requests from several frames/cameras and runs them as one
+    batch once max_batch_size faces are waiting or the oldest request has
+    waited max_wait seconds. submit() returns a Future with the encodings.
+    """
+    def __init__(self, max_batch_size=16, max_wait=0.02, history=200):
+        super().__init__(daemon=True)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.timings = deque(maxlen=history)
+        self._pending = []
+        self._pending_faces = 0
+        self._cond = threading.Condition()
+        self._stopped = False
+
+    def submit(self, rgb_image, face_locations):
+        future = Future()
+        if not face_locations:
+            future.set_result([])
+            return future
+        with self._cond:
+            self._pending.append((time.perf_counter(), rgb_image, face_locations, future))
+            self._pending_faces += len(face_locations)
+            self._cond.notify()
+        return future
+
+    def encode(self, rgb_image, face_locations):
+        """Blocking convenience wrapper around submit()."""
+        return self.submit(rgb_image, face_locations).result()
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._stopped:
+                if self._pending:
+                    deadline = self._pending[0][0] + self.max_wait
+                    remaining = deadline - time.perf_counter()
+                    if self._pending_faces >= self.max_batch_size or remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                else:
+                    self._cond.wait()
+            if self._stopped:
+                return []
+            # Take whole requests up to max_batch_size faces (at least one request)
+            batch, faces = [], 0
+            while self._pending and (not batch or faces + len(self._pending[0][2]) <= self.max_batch_size):
+                request = self._pending.pop(0)
+                batch.append(request)
+                faces += len(request[2])
+            self._pending_faces -= faces
+            return batch
+
+    def run(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            started = time.perf_counter()
+            try:
+                results, timing = encode_batch([(img, locs) for _, img, locs, _ in batch], self.max_batch_size)
+            except Exception as e:
+                for request in batch:
+                    request[3].set_exception(e)
+                continue
+            self.timings.append(timing._replace(wait=started - batch[0][0]))
+            for request, encodings in zip(batch, results):
+                request[3].set_result(encodings)
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            for request in self._pending:
+                request[3].cancel()
+            self._pending = []
+            self._cond.notify()
+
+    def report(self):
+        """Summary of recent batches for tuning max_batch_size / max_wait."""
+        timings = list(self.timings)
+        if not timings:
+            return {'batches': 0}
+        faces = sum(t.faces for t in timings)
+        encode = sum(t.encode for t in timings)
+        return {
+            'batches': len(timings),
+            'mean_faces': faces / len(timings),
+            'mean_wait_ms': sum(t.wait for t in timings) / len(timings) * 1000,
+            'mean_align_ms': sum(t.align for t in timings) / len(timings) * 1000,
+            'mean_encode_ms': encode / len(timings) * 1000,
+            'faces_per_s': faces / encode if encode > 0 else 0.0,
+        }
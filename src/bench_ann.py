@@ -0,0 +1,67 @@
+import time
+import argparse
+import numpy as np
+from matcher import Matcher
+from ann import IVFIndex
+
+ENCODING_DIM = 128
+
+
+def synthetic_gallery(n, seed=0, clusters=2000, spread=0.25, noise=0.08):
+    """
+    Synthetic 128-d encodings with some cluster structure (real face encodings
+    are far from uniform), plus queries that are noisy copies of gallery rows.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(scale=spread, size=(min(clusters, n), ENCODING_DIM)).astype(np.float32)
+    gallery = centers[rng.integers(0, len(centers), size=n)]
+    gallery += rng.normal(scale=noise, size=(n, ENCODING_DIM)).astype(np.float32)
+    return gallery
+
+
+def run(n, n_queries, n_lists, n_probe, seed=0):
+    gallery = synthetic_gallery(n, seed=seed)
+    rng = np.random.default_rng(seed + 1)
+    targets = rng.integers(0, n, size=n_queries)
+    queries = gallery[targets] + rng.normal(scale=0.02, size=(n_queries, ENCODING_DIM)).astype(np.float32)
+
+    matcher = Matcher(gallery)
+
+    start = time.perf_counter()
+    truth = [matcher.top_k(q, k=1)[0][0, 0] for q in queries]
+    brute_ms = (time.perf_counter() - start) / n_queries * 1000
+
+    start = time.perf_counter()
+    index = IVFIndex(n_lists=n_lists, n_probe=n_probe)
+    index.train(matcher.matrix, seed=seed)
+    matcher.set_index(index)
+    build_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    found = [matcher.top_k(q, k=1)[0][0, 0] for q in queries]
+    ann_ms = (time.perf_counter() - start) / n_queries * 1000
+
+    recall = float(np.mean(np.array(found) == np.array(truth)))
+    return {'n': n, 'n_lists': index.n_lists, 'n_probe': n_probe, 'build_s': build_s,
+            'brute_ms': brute_ms, 'ann_ms': ann_ms, 'recall_at_1': recall}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Recall@1 and query latency of the IVF index vs brute force.')
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='comma-separated gallery sizes')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--lists', type=int, default=0, help='IVF cells (default: ~4*sqrt(n))')
+    parser.add_argument('--probes', type=int, default=16)
+    args = parser.parse_args()
+
+    print('{:>9} {:>6} {:>6} {:>9} {:>10} {:>10} {:>9}'.format(
+        'gallery', 'lists', 'probe', 'build s', 'brute ms', 'ivf ms', 'recall@1'))
+    for n in (int(s) for s in args.sizes.split(',')):
+        n_lists = args.lists or int(4 * np.sqrt(n))
+        r = run(n, args.queries, n_lists, args.probes)
+        print('{:>9} {:>6} {:>6} {:>9.2f} {:>10.3f} {:>10.3f} {:>9.3f}'.format(
+            r['n'], r['n_lists'], r['n_probe'], r['build_s'], r['brute_ms'], r['ann_ms'], r['recall_at_1']))
+
+
+if __name__ == '__main__':
+    main()
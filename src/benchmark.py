@@ -0,0 +1,262 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+import cv2
+import face_recognition
+from batching import encode_batch
+from detector import AdaptiveDetector
+from matcher import Matcher, ENCODING_DIM
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def percentiles(samples):
+    if not samples:
+        return {'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0, 'mean_ms': 0.0}
+    ms = np.array(samples) * 1000
+    return {'p50_ms': float(np.percentile(ms, 50)), 'p95_ms': float(np.percentile(ms, 95)),
+            'p99_ms': float(np.percentile(ms, 99)), 'mean_ms': float(ms.mean())}
+
+
+def peak_rss_mb():
+    """Peak RSS of this process so far. Only meaningful per run because each run gets its own process."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_faces(faces_dir):
+    """(name, BGR face image) for every enrolled image, named like db/<name>.jpg."""
+    faces = []
+    for filename in sorted(os.listdir(faces_dir)):
+        if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
+            image = cv2.imread(os.path.join(faces_dir, filename))
+            if image is not None:
+                faces.append((os.path.splitext(filename)[0], image))
+    return faces
+
+
+def synthetic_frames(faces, n_frames, faces_per_frame, size=(1280, 720), seed=0):
+    """
+    Frames with faces_per_frame enrolled faces pasted at random positions on a
+    noisy background. Yields (BGR frame, ground-truth names).
+    """
+    rng = np.random.default_rng(seed)
+    width, height = size
+    cell_w = width // faces_per_frame
+    for _ in range(n_frames):
+        frame = rng.integers(40, 80, size=(height, width, 3), dtype=np.uint8)
+        labels = []
+        for slot, i in enumerate(rng.choice(len(faces), size=faces_per_frame, replace=len(faces) < faces_per_frame)):
+            name, face = faces[i]
+            scale = min(cell_w / face.shape[1], height / face.shape[0], 1.0) * rng.uniform(0.6, 0.9)
+            face = cv2.resize(face, (0, 0), fx=scale, fy=scale)
+            h, w = face.shape[:2]
+            x = slot * cell_w + int(rng.integers(0, max(cell_w - w, 1)))
+            y = int(rng.integers(0, max(height - h, 1)))
+            frame[y:y + h, x:x + w] = face
+            labels.append(name)
+        yield frame, labels
+
+
+def video_frames(path, labels_path=None, max_frames=None):
+    """Frames of a recorded video with optional ground truth {"<frame index>": [names]}."""
+    labels = {}
+    if labels_path:
+        with open(labels_path) as f:
+            labels = json.load(f)
+    cap = cv2.VideoCapture(path)
+    index = 0
+    while max_frames is None or index < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        yield frame, labels.get(str(index))
+        index += 1
+    cap.release()
+
+
+def build_gallery(faces, size, seed=0):
+    """Real encodings of the enrolled faces padded with synthetic distractors up to size."""
+    rng = np.random.default_rng(seed)
+    names, encodings = [], []
+    for name, image in faces:
+        found = face_recognition.face_encodings(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+        if found:
+            names.append(name)
+            encodings.append(found[0])
+    distractors = max(0, size - len(encodings))
+    if distractors:
+        # Roughly the scale of real encodings, far from any real face
+        encodings.extend(rng.normal(scale=0.1, size=(distractors, ENCODING_DIM)))
+        names.extend('distractor_{}'.format(i) for i in range(distractors))
+    return Matcher(encodings, names)
+
+
+def run_pipeline(frames, matcher, tolerance=0.6):
+    """
+    Replays frames through the app's detect -> encode -> match path (the
+    AdaptiveDetector coarse pass, ROI refinement and motion gate, then ROI
+    encoding) and records per-stage latency and accuracy against any ground
+    truth. Tracking is not replayed: every frame that passes the motion gate
+    is encoded, and a static frame keeps the previous frame's matches.
+    """
+    timings = {'detect': [], 'encode': [], 'match': [], 'total': []}
+    correct = expected = predicted = 0
+    start = time.perf_counter()
+    n_frames = static_frames = 0
+    detector = AdaptiveDetector()
+    matches = []
+
+    for frame, truth in frames:
+        t0 = time.perf_counter()
+        detections = detector.detect(frame)
+        t1 = time.perf_counter()
+        timings['detect'].append(t1 - t0)
+        n_frames += 1
+        if detections is None:
+            static_frames += 1
+            timings['total'].append(t1 - t0)
+        else:
+            per_item, _ = encode_batch([(d.image, [d.location]) for d in detections])
+            encodings = [found[0] for found in per_item if found]
+            t2 = time.perf_counter()
+            matches = matcher.match(encodings, tolerance)
+            t3 = time.perf_counter()
+            timings['encode'].append(t2 - t1)
+            timings['match'].append(t3 - t2)
+            timings['total'].append(t3 - t0)
+
+        if truth is not None:
+            names = [m.name for m in matches if m.name is not None]
+            expected += len(truth)
+            predicted += len(names)
+            remaining = list(truth)
+            for name in names:
+                if name in remaining:
+                    remaining.remove(name)
+                    correct += 1
+
+    elapsed = time.perf_counter() - start
+    result = {'frames': n_frames, 'static_frames': static_frames, 'fps': n_frames / elapsed if elapsed > 0 else 0.0,
+              'stages': {stage: percentiles(samples) for stage, samples in timings.items()}}
+    if expected:
+        result['accuracy'] = {'recall': correct / expected,
+                              'precision': correct / predicted if predicted else 0.0}
+    return result
+
+
+def run_match_only(gallery_size, faces_per_frame, n_frames, seed=0):
+    """Matching stage alone on synthetic encodings, for gallery sizes where real faces run out."""
+    rng = np.random.default_rng(seed)
+    gallery = rng.normal(scale=0.1, size=(gallery_size, ENCODING_DIM)).astype(np.float32)
+    matcher = Matcher(gallery, ['id_{}'.format(i) for i in range(gallery_size)])
+    samples, correct = [], 0
+    for _ in range(n_frames):
+        targets = rng.integers(0, gallery_size, size=faces_per_frame)
+        queries = gallery[targets] + rng.normal(scale=0.01, size=(faces_per_frame, ENCODING_DIM))
+        t0 = time.perf_counter()
+        matches = matcher.match(queries)
+        samples.append(time.perf_counter() - t0)
+        correct += sum(m.index == t for m, t in zip(matches, targets))
+    total = sum(samples)
+    return {'frames': n_frames, 'fps': n_frames / total if total > 0 else 0.0,
+            'stages': {'match': percentiles(samples)},
+            'accuracy': {'recall': correct / (n_frames * faces_per_frame)}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Recognition benchmark (detect -> encode -> match).')
+    parser.add_argument('--video', help='recorded video to replay (default: synthetic frames)')
+    parser.add_argument('--labels', help='JSON ground truth for --video: {"<frame index>": [names]}')
+    parser.add_argument('--faces-dir', default='./db', help='enrolled faces for synthetic frames and the gallery')
+    parser.add_argument('--gallery-sizes', default='10,1000,100000')
+    parser.add_argument('--faces-per-frame', default='1,4')
+    parser.add_argument('--frames', type=int, default=50)
+    parser.add_argument('--match-only', action='store_true', help='benchmark matching alone (scales to 1M)')
+    parser.add_argument('--output', default='bench_output.json')
+    parser.add_argument('--in-process', action='store_true',
+                        help='run every configuration in this process (peak RSS then only ever grows)')
+    args = parser.parse_args()
+
+    gallery_sizes = [int(s) for s in args.gallery_sizes.split(',')]
+    faces_per_frame = [int(s) for s in args.faces_per_frame.split(',')]
+    if args.video:
+        # The video's faces per frame are whatever was recorded
+        faces_per_frame = faces_per_frame[:1]
+
+    if not args.in_process and len(gallery_sizes) * len(faces_per_frame) > 1:
+        runs = [run_isolated(gallery_size, per_frame)
+                for gallery_size in gallery_sizes for per_frame in faces_per_frame]
+        write_report(args, runs)
+        return
+
+    faces = [] if args.match_only else load_faces(args.faces_dir)
+    if not args.match_only and not args.video and not faces:
+        parser.error('no face images in {}; pass --video or --match-only'.format(args.faces_dir))
+
+    runs = []
+    for gallery_size in gallery_sizes:
+        matcher = None if args.match_only else build_gallery(faces, gallery_size)
+        for per_frame in faces_per_frame:
+            if args.match_only:
+                result = run_match_only(gallery_size, per_frame, args.frames)
+            elif args.video:
+                result = run_pipeline(video_frames(args.video, args.labels, args.frames), matcher)
+            else:
+                result = run_pipeline(synthetic_frames(faces, args.frames, per_frame), matcher)
+            result.update({'gallery_size': gallery_size, 'faces_per_frame': per_frame,
+                           'peak_rss_mb': peak_rss_mb()})
+            runs.append(result)
+            print('gallery {:>8} faces/frame {:>2}: {:6.1f} fps, total p95 {:.1f} ms'.format(
+                gallery_size, per_frame, result['fps'],
+                result['stages'].get('total', result['stages']['match'])['p95_ms']), flush=True)
+    write_report(args, runs)
+
+
+def run_isolated(gallery_size, per_frame):
+    """
+    Runs one configuration in a fresh interpreter, so its peak RSS is its own
+    rather than the largest gallery benchmarked so far. The command line is
+    repeated with the configuration and output overridden (argparse keeps the
+    last value of a repeated option).
+    """
+    fd, path = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    try:
+        subprocess.check_call([sys.executable, os.path.abspath(__file__)] + sys.argv[1:] +
+                              ['--gallery-sizes', str(gallery_size), '--faces-per-frame', str(per_frame),
+                               '--output', path, '--in-process'])
+        with open(path) as f:
+            return json.load(f)['runs'][0]
+    finally:
+        os.remove(path)
+
+
+def write_report(args, runs):
+    report = {'commit': git_commit(), 'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'config': vars(args), 'runs': runs}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('Results written to {}'.format(args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+import time
+from collections import namedtuple
+import numpy as np
+import cv2
+import face_recognition
+import metrics
+from tracker import iou
+
+# box is (top, right, bottom, left) in full-frame coordinates; image is the RGB
+# ROI crop the face was found in and location its box inside that crop, ready
+# for encoding.
+Detection = namedtuple('Detection', ['box', 'image', 'location'])
+
+
+class AdaptiveDetector:
+    """
+    Two-stage HOG detection: a cheap low-resolution pass over the whole frame
+    finds candidates, then each candidate (and each tracked face) is
+    re-detected in an ROI resized so the face is about target_face pixels
+    tall. Distant faces get upscaled ROIs instead of a bigger full-frame pass.
+
+    The coarse scale grows when small faces are seen (so they stay detectable)
+    and is capped by the CPU budget (coarse_budget seconds per pass). A frame-difference
+    gate skips detection entirely on static scenes.
+    """
+    def __init__(self, min_scale=0.1, max_scale=0.5, default_scale=0.25, min_detect_face=45,
+                 target_face=100, roi_margin=0.4, coarse_budget=0.04,
+                 motion_threshold=2.0, max_static=2.0):
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.default_scale = default_scale
+        self.min_detect_face = min_detect_face
+        self.target_face = target_face
+        self.roi_margin = roi_margin
+        self.coarse_budget = coarse_budget
+        self.motion_threshold = motion_threshold
+        self.max_static = max_static
+
+        self.scale = default_scale
+        self._budget_scale = max_scale
+        self._face_height = None
+        self._prev_thumb = None
+        self._last_detect = 0.0
+
+    def _moved(self, frame, now):
+        """Frame-difference gate on a tiny grayscale thumbnail."""
+        thumb = cv2.cvtColor(cv2.resize(frame, (64, 36), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        prev, self._prev_thumb = self._prev_thumb, thumb
+        if prev is None or now - self._last_detect > self.max_static:
+            return True
+        return float(np.mean(cv2.absdiff(thumb, prev))) >= self.motion_threshold
+
+    def _update_scale(self, coarse_time):
+        if coarse_time > self.coarse_budget:
+            self._budget_scale = max(self.min_scale, self._budget_scale * 0.8)
+        elif coarse_time < self.coarse_budget / 2:
+            self._budget_scale = min(self.max_scale, self._budget_scale * 1.1)
+
+        # Small faces need a larger scale to stay detectable; the budget caps it
+        size_scale = self.default_scale
+        if self._face_height is not None:
+            size_scale = max(self.default_scale, self.min_detect_face / self._face_height)
+        self.scale = float(np.clip(min(size_scale, self._budget_scale), self.min_scale, self.max_scale))
+
+    def _refine(self, frame, box):
+        """Re-detects one face inside an upscaled/downscaled ROI around box."""
+        height, width = frame.shape[:2]
+        top, right, bottom, left = box
+        face_h = max(bottom - top, 1.0)
+        margin_y, margin_x = face_h * self.roi_margin, (right - left) * self.roi_margin
+        y0, y1 = int(max(top - margin_y, 0)), int(min(bottom + margin_y, height))
+        x0, x1 = int(max(left - margin_x, 0)), int(min(right + margin_x, width))
+        if y1 - y0 < 8 or x1 - x0 < 8:
+            return None
+
+        roi_scale = float(np.clip(self.target_face / face_h, 0.25, 3.0))
+        crop = cv2.resize(frame[y0:y1, x0:x1], (0, 0), fx=roi_scale, fy=roi_scale)
+        rgb_crop = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+        locations = face_recognition.face_locations(rgb_crop, number_of_times_to_upsample=0, model='hog')
+        if not locations:
+            return None
+
+        # Keep the face closest to the ROI centre
+        cy, cx = rgb_crop.shape[0] / 2.0, rgb_crop.shape[1] / 2.0
+        location = min(locations, key=lambda l: ((l[0] + l[2]) / 2.0 - cy) ** 2 + ((l[1] + l[3]) / 2.0 - cx) ** 2)
+        t, r, b, l = location
+        full_box = (y0 + t / roi_scale, x0 + r / roi_scale, y0 + b / roi_scale, x0 + l / roi_scale)
+        return Detection(full_box, rgb_crop, location)
+
+    def detect(self, frame, tracked_boxes=()):
+        """
+        Returns a list of Detection, or None when the scene is static and the
+        previous detections still hold.
+        """
+        now = time.monotonic()
+        if self.motion_threshold is not None and not self._moved(frame, now):
+            metrics.inc('frames_static')
+            return None
+        self._last_detect = now
+
+        start = time.perf_counter()
+        with metrics.timer('detect_coarse'):
+            small = cv2.resize(frame, (0, 0), fx=self.scale, fy=self.scale)
+            rgb_small = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+            coarse = [tuple(v / self.scale for v in location)
+                      for location in face_recognition.face_locations(rgb_small, model='hog')]
+        coarse_time = time.perf_counter() - start
+
+        # Tracked faces the coarse pass missed (e.g. too far away) are re-checked too
+        candidates = list(coarse)
+        for box in tracked_boxes:
+            if all(iou(box, c) < 0.3 for c in coarse):
+                candidates.append(box)
+
+        detections = []
+        with metrics.timer('detect_roi'):
+            for box in candidates:
+                detection = self._refine(frame, box)
+                if detection is not None and all(iou(detection.box, d.box) < 0.5 for d in detections):
+                    detections.append(detection)
+
+        if detections:
+            smallest = min(d.box[2] - d.box[0] for d in detections)
+            self._face_height = smallest if self._face_height is None else 0.7 * self._face_height + 0.3 * smallest
+        else:
+            self._face_height = None
+        self._update_scale(coarse_time)
+        return detections
@@ -0,0 +1,226 @@
+import os
+import zlib
+import hashlib
+import zipfile
+import argparse
+import numpy as np
+import face_recognition
+from batching import encode_batch
+
+IMAGE_EXTENSIONS = ('.jpg', '.png')
+CACHE_FILENAME = '.encodings.npz'
+ENCODING_DIM = 128
+# Extra templates of a person are stored as <name>__tpl-<tag>.jpg next to
+# <name>.jpg. The marker is specific enough that existing file names that
+# merely contain '__' (e.g. john__doe.jpg) still load as their own identity.
+TEMPLATE_SEPARATOR = '__tpl-'
+
+
+def identity_name(filename):
+    """The person an image file belongs to: 'alice.jpg' and 'alice__tpl-2.jpg' are both 'alice'."""
+    return os.path.splitext(os.path.basename(filename))[0].split(TEMPLATE_SEPARATOR, 1)[0]
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """SHA-1 of a file's contents, read in chunks."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def encode_images(paths, max_batch_size=64):
+    """
+    Returns the encoding of the first face in each image file (None if there is
+    no face). Descriptors are computed in batches across images.
+    """
+    items = []
+    for path in paths:
+        image = face_recognition.load_image_file(path)
+        items.append((image, face_recognition.face_locations(image)[:1]))
+    results, _ = encode_batch(items, max_batch_size)
+    return [encodings[0] if encodings else None for encodings in results]
+
+
+class CacheEntry:
+    __slots__ = ('mtime', 'size', 'hash', 'encoding')
+
+    def __init__(self, mtime, size, hash, encoding):
+        self.mtime = mtime
+        self.size = size
+        self.hash = hash
+        self.encoding = encoding
+
+
+class EncodingStore:
+    """
+    Persistent cache of face encodings for the images in the db folder. A
+    person may have several images (templates), see identity_name().
+
+    Entries are keyed by file name and validated by mtime and size, falling
+    back to a content hash, so only new or changed images get re-encoded and
+    deleted images are evicted. Everything lives in a single .npz next to
+    the images.
+    """
+    def __init__(self, db_path, cache_path=None, chunk_size=32):
+        self.db_path = db_path
+        self.cache_path = cache_path or os.path.join(db_path, CACHE_FILENAME)
+        self.chunk_size = chunk_size
+        self.entries = {}
+
+        if not os.path.exists(self.db_path):
+            os.mkdir(self.db_path)
+
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with np.load(self.cache_path, allow_pickle=False) as data:
+                files = data['files']
+                mtimes = data['mtimes']
+                sizes = data['sizes']
+                hashes = data['hashes']
+                has_face = data['has_face']
+                encodings = data['encodings']
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile, zlib.error):
+            # A corrupt or truncated cache is just a cold cache
+            return
+
+        for i, filename in enumerate(files):
+            encoding = encodings[i].copy() if has_face[i] else None
+            self.entries[str(filename)] = CacheEntry(int(mtimes[i]), int(sizes[i]), str(hashes[i]), encoding)
+
+    def save(self):
+        """Writes the cache atomically (temp file + rename)."""
+        files = sorted(self.entries)
+        n = len(files)
+        encodings = np.zeros((n, ENCODING_DIM), dtype=np.float64)
+        has_face = np.zeros(n, dtype=bool)
+        for i, filename in enumerate(files):
+            entry = self.entries[filename]
+            if entry.encoding is not None:
+                encodings[i] = entry.encoding
+                has_face[i] = True
+
+        tmp_path = self.cache_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                files=np.array(files, dtype=str),
+                mtimes=np.array([self.entries[k].mtime for k in files], dtype=np.int64),
+                sizes=np.array([self.entries[k].size for k in files], dtype=np.int64),
+                hashes=np.array([self.entries[k].hash for k in files], dtype=str),
+                has_face=has_face,
+                encodings=encodings,
+            )
+        os.replace(tmp_path, self.cache_path)
+
+    def _image_files(self):
+        return sorted(f for f in os.listdir(self.db_path) if f.endswith(IMAGE_EXTENSIONS))
+
+    def sync(self):
+        """
+        Brings the cache in line with the db folder and saves it if anything changed.
+        Returns a report dict with hit/miss/eviction counts and the changed file names.
+        """
+        report = {'hits': 0, 'misses': 0, 'rehashed': 0, 'evicted': 0, 'no_face': 0,
+                  'changed': [], 'removed': []}
+        present = set()
+        misses = []
+
+        for filename in self._image_files():
+            present.add(filename)
+            path = os.path.join(self.db_path, filename)
+            stat = os.stat(path)
+            entry = self.entries.get(filename)
+
+            if entry is not None and entry.mtime == stat.st_mtime_ns and entry.size == stat.st_size:
+                report['hits'] += 1
+                continue
+
+            digest = file_hash(path)
+            if entry is not None and entry.hash == digest:
+                # Touched but not modified: keep the encoding
+                entry.mtime = stat.st_mtime_ns
+                entry.size = stat.st_size
+                report['rehashed'] += 1
+                continue
+
+            misses.append((filename, stat, digest))
+
+        # Encode the misses in chunks so only a few decoded images are held at once
+        for start in range(0, len(misses), self.chunk_size):
+            chunk = misses[start:start + self.chunk_size]
+            encodings = encode_images([os.path.join(self.db_path, filename) for filename, _, _ in chunk])
+            for (filename, stat, digest), encoding in zip(chunk, encodings):
+                self.entries[filename] = CacheEntry(stat.st_mtime_ns, stat.st_size, digest, encoding)
+                report['misses'] += 1
+                report['changed'].append(filename)
+                if encoding is None:
+                    report['no_face'] += 1
+
+        for filename in list(self.entries):
+            if filename not in present:
+                del self.entries[filename]
+                report['evicted'] += 1
+                report['removed'].append(filename)
+
+        if report['misses'] or report['rehashed'] or report['evicted'] or not os.path.exists(self.cache_path):
+            self.save()
+
+        return report
+
+    def put(self, filename, encoding):
+        """
+        Records the encoding of an image already copied into the folder, without
+        re-encoding it. Call save() afterwards to persist.
+        """
+        path = os.path.join(self.db_path, filename)
+        stat = os.stat(path)
+        self.entries[filename] = CacheEntry(stat.st_mtime_ns, stat.st_size, file_hash(path), encoding)
+
+    def rebuild(self):
+        """Drops every cached entry and re-encodes the whole folder."""
+        self.entries = {}
+        return self.sync()
+
+    def encodings(self):
+        return [self.entries[f].encoding for f in sorted(self.entries) if self.entries[f].encoding is not None]
+
+    def names(self):
+        """Identity of each encoding, aligned with encodings()."""
+        return [identity_name(f) for f in sorted(self.entries) if self.entries[f].encoding is not None]
+
+    def files_of(self, name):
+        """Image files of one identity, sorted."""
+        return sorted(f for f in self.entries if identity_name(f) == name)
+
+    def templates(self, name):
+        """Encodings of every image of one identity."""
+        return [self.entries[f].encoding for f in self.files_of(name) if self.entries[f].encoding is not None]
+
+
+def format_report(report):
+    total = report['hits'] + report['rehashed'] + report['misses']
+    hit_rate = (report['hits'] + report['rehashed']) / total * 100 if total else 100.0
+    return ('{} images: {} hits, {} rehashed, {} misses ({} without a face), {} evicted - hit rate {:.1f}%'
+            .format(total, report['hits'], report['rehashed'], report['misses'],
+                    report['no_face'], report['evicted'], hit_rate))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sync or rebuild the face encoding cache.')
+    parser.add_argument('--db', default='./db', help='image folder (default: ./db)')
+    parser.add_argument('--rebuild', action='store_true', help='discard the cache and re-encode every image')
+    args = parser.parse_args()
+
+    store = EncodingStore(args.db)
+    report = store.rebuild() if args.rebuild else store.sync()
+    print(format_report(report))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+import os
+import csv
+import time
+import shutil
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import face_recognition
+from encoding_store import EncodingStore, identity_name, TEMPLATE_SEPARATOR
+from matcher import Matcher
+from templates import MAX_TEMPLATES, template_filename, unique_template_filename, enforce_cap
+
+INPUT_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+# Quality gates
+MIN_FACE_SIZE = 80        # pixels, shorter side of the face box in the original image
+MIN_SHARPNESS = 60.0      # variance of the Laplacian over the face region
+DUPLICATE_DISTANCE = 0.4  # closer than this to someone else is treated as the same person
+MAX_DETECT_SIDE = 1024    # large HR photos are downscaled before detection
+
+
+def read_manifest(path):
+    """(name, image path) pairs from a CSV with name,path columns; relative paths are resolved against the CSV."""
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, newline='') as f:
+        return [(row['name'].strip(), os.path.join(base, row['path'].strip())) for row in csv.DictReader(f)]
+
+
+def read_directory(path):
+    """
+    (name, image path) pairs for the images in a folder, named after the file;
+    alice.jpg, alice__tpl-2.jpg, ... are all templates of alice.
+    """
+    return [(identity_name(f), os.path.join(path, f))
+            for f in sorted(os.listdir(path)) if f.lower().endswith(INPUT_EXTENSIONS)]
+
+
+def assess_image(path, min_face_size=MIN_FACE_SIZE, min_sharpness=MIN_SHARPNESS):
+    """
+    Runs in a pool process: detects, quality-checks and encodes one image.
+    Returns (encoding or None, rejection reason or None).
+    """
+    try:
+        image = face_recognition.load_image_file(path)
+    except (OSError, ValueError):
+        return None, 'unreadable image'
+    return assess_array(image, min_face_size, min_sharpness)
+
+
+def assess_array(image, min_face_size=MIN_FACE_SIZE, min_sharpness=MIN_SHARPNESS):
+    """
+    Quality gate for one RGB image: exactly one face, large and sharp enough.
+    Returns (encoding or None, rejection reason or None).
+    """
+    scale = min(1.0, MAX_DETECT_SIDE / max(image.shape[:2]))
+    if scale < 1.0:
+        image = cv2.resize(image, (0, 0), fx=scale, fy=scale)
+
+    locations = face_recognition.face_locations(image, model='hog')
+    if len(locations) == 0:
+        return None, 'no face'
+    if len(locations) > 1:
+        return None, '{} faces'.format(len(locations))
+
+    top, right, bottom, left = locations[0]
+    if min(bottom - top, right - left) / scale < min_face_size:
+        return None, 'face too small'
+
+    face = cv2.cvtColor(image[max(top, 0):bottom, max(left, 0):right], cv2.COLOR_RGB2GRAY)
+    sharpness = cv2.Laplacian(face, cv2.CV_64F).var()
+    if sharpness < min_sharpness:
+        return None, 'blurry ({:.0f})'.format(sharpness)
+
+    return face_recognition.face_encodings(image, locations)[0], None
+
+
+def check_name(name):
+    """Why name cannot be used as a person's db file name, or None."""
+    if not name:
+        return 'empty name'
+    if TEMPLATE_SEPARATOR in name or '/' in name or os.sep in name or name.startswith('.'):
+        return 'names cannot contain "{}" or "/" or start with "."'.format(TEMPLATE_SEPARATOR)
+    return None
+
+
+def add_photo(store, matcher, name, bgr_image, max_templates=MAX_TEMPLATES, duplicate_distance=DUPLICATE_DISTANCE):
+    """
+    Gates one photo, saves it as name's first or next template and swaps name's
+    templates into matcher with one locked replace. Callers must serialize
+    writers of store. Returns (added to an existing person, rejection reason or None).
+    """
+    encoding, reason = assess_array(cv2.cvtColor(bgr_image, cv2.COLOR_BGR2RGB))
+    if reason is None:
+        match = matcher.match([encoding], tolerance=duplicate_distance)[0]
+        if match.name is not None and match.name != name:
+            reason = 'looks like {}, who is already registered'.format(match.name)
+    if reason is not None:
+        return False, reason
+
+    existing = bool(store.files_of(name))
+    if existing:
+        filename = unique_template_filename(store.db_path, name, time.strftime('%Y%m%d%H%M%S'))
+    else:
+        filename = name + '.jpg'
+    cv2.imwrite(os.path.join(store.db_path, filename), bgr_image)
+    store.put(filename, encoding)
+    enforce_cap(store, name, max_templates)
+    store.save()
+    matcher.replace(name, store.templates(name))
+    return existing, None
+
+
+def remove_person(store, matcher, name):
+    """Deletes every photo of name and drops them from store and matcher. Returns the number removed."""
+    files = store.files_of(name)
+    for filename in files:
+        os.remove(os.path.join(store.db_path, filename))
+        del store.entries[filename]
+    if files:
+        store.save()
+    matcher.remove(name)
+    return len(files)
+
+
+def enroll(entries, db_path, workers=None, replace=False, duplicate_distance=DUPLICATE_DISTANCE,
+           min_face_size=MIN_FACE_SIZE, min_sharpness=MIN_SHARPNESS, max_templates=MAX_TEMPLATES,
+           progress_every=100):
+    """
+    Encodes entries (name, path) in a process pool, gates them on quality and
+    near-duplicates, copies accepted images into db_path and records their
+    encodings in the encoding store with a single atomic save.
+    Returns (accepted names, [(name, path, reason)] rejections).
+    """
+    store = EncodingStore(db_path)
+    store.sync()
+    existing = set(store.names())
+    gallery = Matcher(store.encodings(), store.names())
+
+    accepted, rejected = [], []
+    pending = []
+    for name, path in entries:
+        # Names become db file names: a bad one could escape db/ or pass as someone's template
+        invalid = check_name(name)
+        if invalid is not None:
+            rejected.append((name, path, invalid))
+        elif name in existing and not replace:
+            rejected.append((name, path, 'already enrolled'))
+        else:
+            pending.append((name, path))
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        assessments = pool.map(assess_image, [p for _, p in pending],
+                               [min_face_size] * len(pending), [min_sharpness] * len(pending),
+                               chunksize=8)
+        for done, ((name, path), (encoding, reason)) in enumerate(zip(pending, assessments), 1):
+            if reason is None:
+                match = gallery.match([encoding], tolerance=duplicate_distance)[0]
+                if match.name is not None and match.name != name:
+                    reason = 'near-duplicate of {} ({:.2f})'.format(match.name, match.distance)
+            if reason is not None:
+                rejected.append((name, path, reason))
+            else:
+                # Later entries in the same run are also checked against this one
+                gallery.add(name, encoding)
+                accepted.append((name, path, encoding))
+
+            if progress_every and done % progress_every == 0:
+                elapsed = time.perf_counter() - start
+                print('{}/{} images, {:.1f} images/s, {} rejected'.format(
+                    done, len(pending), done / elapsed, len(rejected)), flush=True)
+
+    # Several accepted photos of one person become <name>.jpg, <name>__tpl-2.jpg, ...
+    copies = {}
+    for name, path, encoding in accepted:
+        if name in existing and name not in copies:
+            # --replace drops every previous template of the person
+            for old in store.files_of(name):
+                os.remove(os.path.join(db_path, old))
+                del store.entries[old]
+        copies[name] = copies.get(name, 0) + 1
+        ext = os.path.splitext(path)[1].lower()
+        ext = '.jpg' if ext == '.jpeg' else ext
+        filename = name + ext if copies[name] == 1 else template_filename(name, copies[name], ext)
+        shutil.copyfile(path, os.path.join(db_path, filename))
+        store.put(filename, encoding)
+    for name in copies:
+        enforce_cap(store, name, max_templates)
+    if accepted:
+        store.save()
+
+    elapsed = time.perf_counter() - start
+    print('{} enrolled, {} rejected in {:.1f}s ({:.1f} images/s)'.format(
+        len(accepted), len(rejected), elapsed, len(pending) / elapsed if elapsed > 0 else 0.0))
+    return [name for name, _, _ in accepted], rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk-enroll users from a folder of photos or a CSV manifest.')
+    parser.add_argument('source', help='folder of images named <name>.jpg, or a CSV with name,path columns')
+    parser.add_argument('--db', default='./db')
+    parser.add_argument('--workers', type=int, default=None, help='encoding processes (default: CPU count)')
+    parser.add_argument('--replace', action='store_true', help='re-enroll names that already exist')
+    parser.add_argument('--min-face', type=int, default=MIN_FACE_SIZE, help='minimum face size in pixels')
+    parser.add_argument('--min-sharpness', type=float, default=MIN_SHARPNESS, help='minimum Laplacian variance')
+    parser.add_argument('--duplicate-distance', type=float, default=DUPLICATE_DISTANCE)
+    parser.add_argument('--max-templates', type=int, default=MAX_TEMPLATES, help='photos kept per person')
+    parser.add_argument('--report', default='enroll_rejections.csv', help='where to write the rejection report')
+    args = parser.parse_args()
+
+    entries = read_directory(args.source) if os.path.isdir(args.source) else read_manifest(args.source)
+    _, rejected = enroll(entries, args.db, workers=args.workers, replace=args.replace,
+                         duplicate_distance=args.duplicate_distance,
+                         min_face_size=args.min_face, min_sharpness=args.min_sharpness,
+                         max_templates=args.max_templates)
+
+    if rejected:
+        with open(args.report, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['name', 'path', 'reason'])
+            writer.writerows(rejected)
+        print('Rejection report written to {}'.format(args.report))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+import time
+from collections import namedtuple
+import numpy as np
+import cv2
+import metrics
+
+# landmarks is the (68, 2) dlib shape in crop coordinates; patch is a
+# native-resolution grayscale square from the middle of the face (or None
+# when the face is too small to have one).
+Sample = namedtuple('Sample', ['time', 'landmarks', 'patch'])
+
+# live is True/False; reason names the check that decided; cost is the
+# processing time spent on the track's samples and elapsed the wall time
+# from the first sample to the verdict, both in seconds.
+Verdict = namedtuple('Verdict', ['live', 'reason', 'samples', 'cost', 'elapsed'])
+
+LIVE = 'live'
+SPOOF = 'spoof'
+
+LEFT_EYE = slice(36, 42)
+RIGHT_EYE = slice(42, 48)
+PATCH_SIZE = 64
+
+
+def eye_aspect_ratio(eye):
+    """Eye height over width from the six dlib eye points; drops sharply while the eye is closed."""
+    vertical = np.linalg.norm(eye[1] - eye[5]) + np.linalg.norm(eye[2] - eye[4])
+    return vertical / (2.0 * max(np.linalg.norm(eye[0] - eye[3]), 1e-6))
+
+
+def inter_ocular(landmarks):
+    return max(float(np.linalg.norm(landmarks[LEFT_EYE].mean(axis=0) - landmarks[RIGHT_EYE].mean(axis=0))), 1e-6)
+
+
+class BlinkCheck:
+    """
+    Live once an eye closes and reopens: the mean eye aspect ratio of one
+    sample falls below closed_ratio of the track's median and a later sample
+    is back above open_ratio of it. A photo's ratio stays flat.
+    """
+    name = 'blink'
+
+    def __init__(self, closed_ratio=0.7, open_ratio=0.9, min_ear=0.15):
+        self.closed_ratio = closed_ratio
+        self.open_ratio = open_ratio
+        self.min_ear = min_ear
+
+    def __call__(self, samples):
+        ears = np.array([(eye_aspect_ratio(s.landmarks[LEFT_EYE]) + eye_aspect_ratio(s.landmarks[RIGHT_EYE])) / 2
+                         for s in samples])
+        if len(ears) < 3:
+            return None
+        baseline = float(np.median(ears))
+        if baseline < self.min_ear:
+            return None  # eyes not visible well enough to tell
+        closed = np.flatnonzero(ears < self.closed_ratio * baseline)
+        if len(closed) and np.any(ears[closed[0] + 1:] > self.open_ratio * baseline):
+            return LIVE
+        return None
+
+
+class LandmarkMotionCheck:
+    """
+    Live once the landmarks move non-rigidly. Every view of a flat photo or
+    screen is a homography of the first one, so its landmarks fit one almost
+    exactly; head turns and expressions leave a residual. The RMS residual is
+    measured in inter-ocular distances and must exceed min_residual in
+    min_hits of the last recent samples, which keeps landmark jitter from
+    counting.
+    """
+    name = 'motion'
+
+    def __init__(self, min_residual=0.06, min_hits=2, recent=10):
+        self.min_residual = min_residual
+        self.min_hits = min_hits
+        self.recent = recent
+
+    def __call__(self, samples):
+        if len(samples) < self.min_hits + 1:
+            return None
+        reference = samples[0].landmarks
+        scale = inter_ocular(reference)
+        hits = 0
+        for sample in samples[1:][-self.recent:]:
+            points = sample.landmarks
+            homography, _ = cv2.findHomography(reference, points, 0)
+            if homography is None:
+                continue
+            fitted = cv2.perspectiveTransform(reference.reshape(-1, 1, 2), homography).reshape(-1, 2)
+            residual = float(np.sqrt(np.mean(np.sum((fitted - points) ** 2, axis=1)))) / scale
+            hits += residual >= self.min_residual
+        return LIVE if hits >= self.min_hits else None
+
+
+class TextureCheck:
+    """
+    Spoof when the face texture shows strong periodic peaks: screens and
+    halftone prints re-imaged by the camera produce moiré, i.e. isolated
+    high-frequency spikes in the spectrum of a native-resolution patch. Skin
+    has a smooth, decaying spectrum. The median over the last recent patches
+    is used. Never votes live on its own.
+    """
+    name = 'texture'
+
+    def __init__(self, max_peakiness=25.0, min_samples=3, recent=8):
+        self.max_peakiness = max_peakiness
+        self.min_samples = min_samples
+        self.recent = recent
+        self._window = np.outer(np.hanning(PATCH_SIZE), np.hanning(PATCH_SIZE)).astype(np.float32)
+        yy, xx = np.mgrid[:PATCH_SIZE, :PATCH_SIZE] - PATCH_SIZE // 2
+        self._high_band = np.hypot(yy, xx) > PATCH_SIZE / 4
+
+    def peakiness(self, patch):
+        """Highest over mean spectral magnitude in the high-frequency band."""
+        patch = patch.astype(np.float32)
+        spectrum = np.abs(np.fft.fftshift(np.fft.fft2((patch - patch.mean()) * self._window)))
+        band = spectrum[self._high_band]
+        return float(band.max() / max(band.mean(), 1e-6))
+
+    def __call__(self, samples):
+        scores = [self.peakiness(s.patch) for s in samples[-self.recent:] if s.patch is not None]
+        if len(scores) < self.min_samples:
+            return None
+        return SPOOF if float(np.median(scores)) > self.max_peakiness else None
+
+
+def default_checks():
+    return [TextureCheck(), BlinkCheck(), LandmarkMotionCheck()]
+
+
+class _Pending:
+    __slots__ = ('name', 'started', 'last_sample', 'samples', 'cost')
+
+    def __init__(self, name, now):
+        self.name = name
+        self.started = now
+        self.last_sample = float('-inf')
+        self.samples = []
+        self.cost = 0.0
+
+
+class LivenessGate:
+    """
+    Liveness stage for matched tracks only. While a track has a gallery match
+    but no verdict, each frame it is seen in (at most one per min_interval
+    seconds) contributes a Sample: 68-point landmarks from a face crop resized
+    to landmark_height pixels, plus a texture patch. Checks see the samples so
+    far and vote LIVE, SPOOF or None; any SPOOF vote fails the track, a LIVE
+    vote passes it once min_samples are in, and a track with no vote after
+    window seconds fails. The verdict is cached for the track's lifetime, so
+    each person is checked once per visit; if the track is re-matched to
+    someone else its samples and verdict are dropped and the check restarts.
+
+    Checks are callables taking the sample list, so cues can be swapped or
+    added. on_verdict, if set, is called with (name, Verdict) once per track.
+    """
+    def __init__(self, checks=None, window=5.0, min_interval=0.05, min_samples=4, max_samples=100,
+                 landmark_height=150, margin=0.2):
+        self.checks = list(checks) if checks is not None else default_checks()
+        self.window = window
+        self.min_interval = min_interval
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self.landmark_height = landmark_height
+        self.margin = margin
+        self.verdicts = {}  # track id -> (name, Verdict)
+        self.on_verdict = None
+        self._pending = {}
+
+    def _sample(self, frame, box, now):
+        height, width = frame.shape[:2]
+        top, right, bottom, left = box
+        face_h, face_w = bottom - top, right - left
+        y0, y1 = int(max(top - face_h * self.margin, 0)), int(min(bottom + face_h * self.margin, height))
+        x0, x1 = int(max(left - face_w * self.margin, 0)), int(min(right + face_w * self.margin, width))
+        if face_h < 16 or y1 - y0 < 16 or x1 - x0 < 16:
+            return None
+
+        scale = self.landmark_height / face_h
+        crop = cv2.resize(frame[y0:y1, x0:x1], (0, 0), fx=scale, fy=scale)
+        rgb_crop = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+        location = (int((top - y0) * scale), int((right - x0) * scale), int((bottom - y0) * scale),
+                    int((left - x0) * scale))
+        # Imported here: the checks and the gate itself work without dlib
+        from face_recognition import api as fr_api
+        shape = fr_api._raw_face_landmarks(rgb_crop, [location], model='large')[0]
+        landmarks = np.array([(p.x, p.y) for p in shape.parts()], dtype=np.float32)
+
+        # Texture is read at native resolution: resampling would wash out moiré
+        patch = None
+        cy, cx = int((top + bottom) / 2), int((left + right) / 2)
+        half = PATCH_SIZE // 2
+        if face_h >= PATCH_SIZE and cy - half >= 0 and cx - half >= 0 and cy + half <= height and cx + half <= width:
+            patch = cv2.cvtColor(frame[cy - half:cy + half, cx - half:cx + half], cv2.COLOR_BGR2GRAY)
+        return Sample(now, landmarks, patch)
+
+    def _decide(self, state, now):
+        live_by = None
+        for check in self.checks:
+            vote = check(state.samples)
+            if vote == SPOOF:
+                return False, check.name
+            if vote == LIVE and live_by is None:
+                live_by = check.name
+        if live_by is not None and len(state.samples) >= self.min_samples:
+            return True, live_by
+        if now - state.started > self.window:
+            return False, 'no blink or facial motion'
+        return None
+
+    def update(self, tracks, frame, now):
+        """Samples the matched tracks without a verdict and sets track.live (None while pending)."""
+        alive = {t.id for t in tracks}
+        for cache in (self.verdicts, self._pending):
+            for track_id in [i for i in cache if i not in alive]:
+                del cache[track_id]
+
+        for track in tracks:
+            cached = self.verdicts.get(track.id)
+            if cached is not None and cached[0] == track.name:
+                track.live = cached[1].live
+                continue
+            track.live = None
+            if track.name is None:
+                continue
+            state = self._pending.get(track.id)
+            if state is None or state.name != track.name:
+                # A re-match to someone else starts over: earlier samples and
+                # verdicts vouch for the old identity, not this one
+                self.verdicts.pop(track.id, None)
+                state = self._pending[track.id] = _Pending(track.name, now)
+            if now - state.last_sample < self.min_interval:
+                continue
+            state.last_sample = now
+
+            start = time.perf_counter()
+            with metrics.timer('liveness'):
+                sample = self._sample(frame, track.box, now)
+                if sample is not None:
+                    state.samples.append(sample)
+                    del state.samples[:-self.max_samples]
+                decision = self._decide(state, now)
+            state.cost += time.perf_counter() - start
+            if decision is None:
+                continue
+
+            live, reason = decision
+            verdict = Verdict(live, reason, len(state.samples), state.cost, now - state.started)
+            self.verdicts[track.id] = (track.name, verdict)
+            del self._pending[track.id]
+            track.live = live
+            metrics.inc('liveness_passed' if live else 'liveness_failed')
+            if self.on_verdict is not None:
+                self.on_verdict(track.name, verdict)
@@ -0,0 +1,104 @@
+import json
+import time
+import argparse
+import threading
+import http.client
+from urllib.parse import urlparse
+import numpy as np
+import cv2
+
+
+def percentiles(samples):
+    if not samples:
+        return {'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+    ms = np.array(samples) * 1000
+    return {'p50_ms': float(np.percentile(ms, 50)), 'p95_ms': float(np.percentile(ms, 95)),
+            'p99_ms': float(np.percentile(ms, 99)), 'max_ms': float(ms.max())}
+
+
+def build_request(image_path, raw=False):
+    """(path suffix, body, content type) for an identify request with image_path as JPEG or raw BGR."""
+    if not raw:
+        with open(image_path, 'rb') as f:
+            return '', f.read(), 'image/jpeg'
+    image = cv2.imread(image_path)
+    if image is None:
+        raise SystemExit('cannot read {}'.format(image_path))
+    height, width = image.shape[:2]
+    return '?width={}&height={}&format=bgr'.format(width, height), image.tobytes(), 'application/octet-stream'
+
+
+def client(url, path, body, content_type, deadline, latencies, statuses, lock):
+    """One keep-alive connection sending requests back to back until deadline."""
+    conn = None
+    while time.perf_counter() < deadline:
+        if conn is None:
+            conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+        start = time.perf_counter()
+        try:
+            conn.request('POST', path, body=body, headers={'Content-Type': content_type})
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = None
+            status = 'error'
+        elapsed = time.perf_counter() - start
+        with lock:
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 200:
+                latencies.append(elapsed)
+        if status == 503:
+            # Honour the server's backpressure instead of hammering it
+            time.sleep(0.05)
+    if conn is not None:
+        conn.close()
+
+
+def run(url, image_path, concurrency, duration, raw=False):
+    url = urlparse(url)
+    suffix, body, content_type = build_request(image_path, raw)
+    path = url.path.rstrip('/') + '/identify' + suffix
+    latencies, statuses, lock = [], {}, threading.Lock()
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=client, args=(url, path, body, content_type, deadline, latencies, statuses, lock))
+               for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return {'concurrency': concurrency, 'duration_s': elapsed, 'requests_per_s': len(latencies) / elapsed,
+            'statuses': {str(k): v for k, v in statuses.items()}, 'latency': percentiles(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test for the recognition HTTP API (POST /identify).')
+    parser.add_argument('image', help='face image sent with every request')
+    parser.add_argument('--url', default='http://127.0.0.1:8080')
+    parser.add_argument('--concurrency', default='1,4,16', help='comma-separated client counts to step through')
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds per step')
+    parser.add_argument('--raw', action='store_true', help='send raw BGR frames instead of the JPEG')
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    results = []
+    for concurrency in (int(c) for c in args.concurrency.split(',')):
+        result = run(args.url, args.image, concurrency, args.duration, args.raw)
+        results.append(result)
+        latency = result['latency']
+        print('{:>3} clients: {:7.1f} req/s  p50 {:6.1f}  p95 {:6.1f}  p99 {:6.1f} ms  statuses {}'.format(
+            concurrency, result['requests_per_s'], latency['p50_ms'], latency['p95_ms'], latency['p99_ms'],
+            result['statuses']), flush=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print('Results written to {}'.format(args.output))
+
+
+if __name__ == '__main__':
+    main()
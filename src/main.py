@@ -1,12 +1,23 @@
+import time
+_STARTED = time.perf_counter()  # taken before the other imports, for the startup report
 import tkinter as tk
-from tkinter import ttk
+import queue
+import traceback
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import cv2
 import util
 import os
 from PIL import Image, ImageTk
-import face_recognition
-import datetime
-import numpy as np
+from matcher import Matcher
+from pipeline import RecognitionPipeline
+import attendance
+from autoattend import ClockInDebouncer
+import metrics
+
+# face_recognition/dlib and everything built on it (encoding store, tracker,
+# detector, enrollment) is imported by _load_recognition on a background
+# thread, so the window and the camera preview do not wait for the models.
 
 class App:
     def __init__(self):
@@ -17,16 +28,34 @@ class App:
 
         # Database and Paths
         self.db_dir = './db'
-        self.log_path = './log.txt'
+        self.log_path = './attendance.db'
+        self.legacy_log_path = './log.txt'
         
         # State Variables
-        self.known_face_encodings = []
-        self.known_face_names = []
-        self.most_recent_capture_arr = None
+        self.startup = {'imports': time.perf_counter() - _STARTED}
+        self.store = None
+        self.matcher = None
+        self.cap = None
+        self.camera_failed = False
+        self.current_frame = None
+        self.display = util.PhotoBuffer()
+        self.reg_display = util.PhotoBuffer()
         self.temp_capture = None
-        self.frame_count = 0
         self.cached_faces = []
-        self.status_text = "Initializing..."
+        self.last_frame_id = None
+        self.pipeline = None
+        self.recognizer = None
+        self.unmatched_labels = ()  # overlay labels drawn red; set once tracker is imported
+        self.ui_calls = queue.Queue()
+        # Single worker so registrations and harvested templates never touch the store concurrently
+        self.gallery_jobs = ThreadPoolExecutor(max_workers=1)
+        self.auto_attendance = False
+        self.debug_overlay = os.environ.get('ATTENDANCE_DEBUG_OVERLAY') == '1'
+        self.debouncer = ClockInDebouncer()
+        self.match_strategy = os.environ.get('ATTENDANCE_MATCH_STRATEGY', 'min')  # min or centroid
+        self.harvest_templates = os.environ.get('ATTENDANCE_HARVEST_TEMPLATES') == '1'
+        self.check_liveness = os.environ.get('ATTENDANCE_LIVENESS', '1') != '0'
+        self.status_text = "Loading face models..."
         self.status_color = "#FFA657"  # Orange for initializing
         
         # UI Elements
@@ -35,7 +64,9 @@ class App:
         self.log_listbox = None
         self.login_button = None
         self.register_button = None
+        self.auto_button = None
         self.registerWindow = None
+        self.save_button = None
         self.reg_webcam_label = None
         self.reg_webcam_container = None
         self.name_entry = None
@@ -47,17 +78,121 @@ class App:
         if not os.path.exists(self.db_dir):
             os.mkdir(self.db_dir)
 
-        # Load Known Faces
-        self.known_face_encodings, self.known_face_names = util.load_db(self.db_dir)
-
-        # UI Layout
+        # Instrumentation is off (and near-free) unless enabled via the environment or F3
+        # F3 only switches instrumentation off again if the environment did not ask for it
+        self.metrics_from_env = metrics.configure_from_env()
+        if self.debug_overlay:
+            metrics.registry.enabled = True
+
+        # Attendance store (one-time import of a legacy log.txt)
+        self.attendance = attendance.open_store(self.log_path)
+        if os.path.exists(self.legacy_log_path) and self.attendance.count() == 0:
+            self.attendance.import_log(self.legacy_log_path)
+        self.attendance_writer = attendance.AttendanceWriter(
+            self.attendance, on_written=lambda punches: self._call_in_ui(self._update_log_history))
+        self.attendance_writer.start()
+
+        # UI Layout: the window comes up first; clock-in and registration wait for the models
         self._setup_ui()
-        
-        # Webcam Setup
-        self.cap = cv2.VideoCapture(0)
-        self._update_status("Camera Ready", "#238636")  # Green
+        self.login_button.config(state='disabled')
+        self.register_button.config(state='disabled')
+        self.mainWindow.protocol("WM_DELETE_WINDOW", self.close)
+        self.mainWindow.bind('<F3>', self.toggle_debug_overlay)
+        self.mainWindow.update_idletasks()
+        self.startup['window_at'] = time.perf_counter() - _STARTED
+
+        # Staged startup: the camera preview and the face models/gallery load in parallel
+        threading.Thread(target=self._open_camera, daemon=True).start()
+        threading.Thread(target=self._load_recognition, daemon=True).start()
         self.process_webcam()
 
+    def _open_camera(self):
+        start = time.perf_counter()
+        cap = cv2.VideoCapture(0)
+        self.startup['camera_open'] = time.perf_counter() - start
+        self._call_in_ui(lambda: self._on_camera_ready(cap))
+
+    def _on_camera_ready(self, cap):
+        self.cap = cap
+        if not cap.isOpened():
+            self.camera_failed = True
+            self._update_status("No camera found", "#DA3633")
+            return
+        # Preview only until the recognizer is ready
+        self.pipeline = RecognitionPipeline(cap)
+        self.pipeline.start()
+        if self.recognizer is not None:
+            self._enable_recognition()
+
+    def _load_recognition(self):
+        """Background stage: face models, then the gallery, then the recognizer"""
+        try:
+            start = time.perf_counter()
+            import face_recognition  # loads dlib and the model files
+            import ann
+            from encoding_store import EncodingStore
+            from tracker import TrackedRecognizer, UNKNOWN, NOT_LIVE
+            from templates import TemplateHarvester
+            from liveness import LivenessGate
+            import enroll
+            self.startup['model_load'] = time.perf_counter() - start
+
+            self._call_in_ui(lambda: self._update_status("Loading gallery...", "#FFA657"))
+            start = time.perf_counter()
+            store = EncodingStore(self.db_dir)
+            store.sync()
+            matcher = Matcher(store.encodings(), store.names(), strategy=self.match_strategy)
+            ann.attach_index(matcher, self.db_dir)
+            metrics.set_gauge('gallery_size', len(matcher))
+            self.startup['gallery_load'] = time.perf_counter() - start
+
+            harvester = None
+            if self.harvest_templates:
+                harvester = TemplateHarvester(store, matcher, dispatch=self.gallery_jobs.submit)
+            liveness = None
+            if self.check_liveness:
+                liveness = LivenessGate()
+                liveness.on_verdict = self._on_liveness
+            recognizer = TrackedRecognizer(matcher, harvester=harvester, liveness=liveness)
+            recognizer.on_recognized = self._on_recognized
+            self.unmatched_labels = (UNKNOWN, NOT_LIVE)
+        except Exception as e:
+            message = f"Face models failed to load: {e}"
+            self._call_in_ui(lambda: self._update_status(message, "#DA3633"))
+            return
+        self._call_in_ui(lambda: self._on_recognition_ready(store, matcher, recognizer))
+
+    def _on_recognition_ready(self, store, matcher, recognizer):
+        self.store = store
+        self.matcher = matcher
+        self.recognizer = recognizer
+        self.login_button.config(state='normal')
+        self.register_button.config(state='normal')
+        if self.pipeline is not None:
+            self._enable_recognition()
+        elif not self.camera_failed:
+            self._update_status("Starting camera...", "#FFA657")
+        # else keep showing "No camera found"; there is nothing left to wait for
+
+    def _enable_recognition(self):
+        self.pipeline.enable_recognition(self.recognizer, track_fn=self.recognizer.track)
+        self.startup['ready_at'] = time.perf_counter() - _STARTED
+        self._update_status("Camera Ready", "#238636")  # Green
+        self._report_startup()
+
+    def _report_startup(self):
+        """Prints the startup breakdown once the first frame is on screen and recognition is running"""
+        if 'ready_at' not in self.startup or 'first_frame_at' not in self.startup or 'reported' in self.startup:
+            return
+        self.startup['reported'] = True
+        labels = [('imports', 'imports'), ('window_at', 'window at'), ('camera_open', 'camera open'),
+                  ('first_frame_at', 'first frame at'), ('model_load', 'model load'),
+                  ('gallery_load', 'gallery load'), ('ready_at', 'ready at')]
+        print('Startup: ' + ' | '.join(f'{label} {self.startup[key]:.2f}s' for key, label in labels if key in self.startup))
+        for key, _ in labels:
+            if key in self.startup:
+                metrics.set_gauge(f'startup_{key}_seconds', round(self.startup[key], 3))
+
     def _setup_ui(self):
         # Header with gradient effect
         header_frame = tk.Frame(self.mainWindow, bg='#161B22', height=80)
@@ -113,6 +248,10 @@ class App:
         self.register_button.pack(fill='x', pady=6, ipady=8)
         util.ToolTip(self.register_button, "Register a new user in the system")
 
+        self.auto_button = util.get_button(control_frame, '🤖 AUTO CLOCK-IN: OFF', '#30363D', self.toggle_auto_attendance)
+        self.auto_button.pack(fill='x', pady=6, ipady=8)
+        util.ToolTip(self.auto_button, "Clock in recognized users automatically from the live feed")
+
         # Separator
         tk.Frame(right_panel, height=1, bg='#30363D').pack(fill='x', padx=25, pady=15)
 
@@ -147,27 +286,11 @@ class App:
 
     def _update_log_history(self):
         self.log_listbox.delete(0, tk.END)
-        if os.path.exists(self.log_path):
-            with open(self.log_path, 'r') as f:
-                lines = f.readlines()
-                start_index = max(0, len(lines) - 25)
-                recent_lines = lines[start_index:]
-                recent_lines.reverse()
-                for line in recent_lines:
-                    if line.strip():
-                        parts = line.strip().split(',')
-                        if len(parts) >= 2:
-                            name = parts[0]
-                            timestamp = parts[1]
-                            # Parse timestamp
-                            try:
-                                dt = datetime.datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S.%f')
-                                time_str = dt.strftime('%I:%M %p')
-                                date_str = dt.strftime('%b %d')
-                                formatted = f"  ✓ {name:<15} {date_str} at {time_str}"
-                            except:
-                                formatted = f"  ✓ {name} - {timestamp}"
-                            self.log_listbox.insert(tk.END, formatted)
+        # Indexed query for the newest 25 punches; no history re-read
+        for name, dt in self.attendance.recent(25):
+            time_str = dt.strftime('%I:%M %p')
+            date_str = dt.strftime('%b %d')
+            self.log_listbox.insert(tk.END, f"  ✓ {name:<15} {date_str} at {time_str}")
 
     def _update_status(self, text, color):
         """Update the status indicator"""
@@ -177,83 +300,191 @@ class App:
             self.status_indicator.config(fg=color)
             self.status_label.config(text=text)
 
+    def _call_in_ui(self, func):
+        """Schedules func on the Tk thread (worker threads must not touch widgets)"""
+        self.ui_calls.put(func)
+
+    def _run_ui_calls(self):
+        while True:
+            try:
+                func = self.ui_calls.get_nowait()
+            except queue.Empty:
+                return
+            # One failing callback must not stop the render loop that drains the queue
+            try:
+                func()
+            except Exception:
+                traceback.print_exc()
+
     def process_webcam(self):
-        ret, frame = self.cap.read()
-        if not ret:
+        self._run_ui_calls()
+
+        # Only render: capture and recognition happen in the pipeline threads
+        if self.pipeline is None:
             self.mainWindow.after(30, self.process_webcam)
             return
-
-        self.most_recent_capture_arr = frame.copy()
-        
-        # Performance: Only run recognition every 15 frames (reduced CPU usage)
-        if self.frame_count % 45 == 0:
-            small_frame = cv2.resize(frame, (0, 0), fx=0.2, fy=0.2)
-            rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-            
-            face_locations = face_recognition.face_locations(rgb_small_frame, model='hog')
-            face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
-
-            self.cached_faces = []
-            for (top, right, bottom, left), face_encoding in zip(face_locations, face_encodings):
-                name = "Unknown"
-                if len(self.known_face_encodings) > 0:
-                    matches = face_recognition.compare_faces(self.known_face_encodings, face_encoding, tolerance=0.6)
-                    face_distances = face_recognition.face_distance(self.known_face_encodings, face_encoding)
-                    best_match_index = np.argmin(face_distances)
-                    if matches[best_match_index]:
-                        name = self.known_face_names[best_match_index]
-                self.cached_faces.append((top*5, right*5, bottom*5, left*5, name))
-
-        # Draw overlay
-        for (top, right, bottom, left, name) in self.cached_faces:
-            color = (88, 166, 255) if name != "Unknown" else (255, 100, 100)  # Blue/Red
-            cv2.rectangle(frame, (left, top), (right, bottom), color, 3)
-            
-            # Name tag background
-            cv2.rectangle(frame, (left, bottom + 2), (right, bottom + 32), color, cv2.FILLED)
-            cv2.putText(frame, name, (left + 8, bottom + 22), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-
-        self.frame_count += 1
-        img_ = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        img_pil = Image.fromarray(img_)
-        imgtk = ImageTk.PhotoImage(image=img_pil)
-        self.webcam_label.imgtk = imgtk
-        self.webcam_label.configure(image=imgtk)
+        latest = self.pipeline.latest_frame()
+        if latest is None or latest.id == self.last_frame_id:
+            if latest is not None:
+                latest.release()
+            self.mainWindow.after(30, self.process_webcam)
+            return
+        # Hold the frame on screen until the next one replaces it
+        if self.current_frame is not None:
+            self.current_frame.release()
+        self.current_frame = latest
+        self.last_frame_id = latest.id
+
+        result = self.pipeline.latest_result()
+        if result is not None:
+            self.cached_faces = result[1]
+
+        # The one colour conversion per frame, into a reused buffer that the
+        # register preview is scaled from before overlays are drawn on it
+        with metrics.timer('convert'):
+            height, width = latest.image.shape[:2]
+            frame = self.display.get(width, height)
+            cv2.cvtColor(latest.image, cv2.COLOR_BGR2RGBA, dst=frame)
+            if self.registerWindow is not None and self.registerWindow.winfo_exists():
+                self._render_reg_preview(frame)
+
+        with metrics.timer('overlay'):
+            for (top, right, bottom, left, name) in self.cached_faces:
+                color = (255, 166, 88, 255) if name not in self.unmatched_labels else (100, 100, 255, 255)  # Blue/Red
+                cv2.rectangle(frame, (left, top), (right, bottom), color, 3)
+
+                # Name tag background
+                cv2.rectangle(frame, (left, bottom + 2), (right, bottom + 32), color, cv2.FILLED)
+                cv2.putText(frame, name, (left + 8, bottom + 22), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255, 255), 2)
+
+            if self.debug_overlay:
+                self._draw_debug_overlay(frame)
+
+        with metrics.timer('photoimage'):
+            self.display.show(self.webcam_label)
+        if 'first_frame_at' not in self.startup:
+            self.startup['first_frame_at'] = time.perf_counter() - _STARTED
+            self._report_startup()
 
         self.mainWindow.after(30, self.process_webcam)
 
+    def _render_reg_preview(self, frame):
+        """Scales the converted frame into the register window's preview, no larger than 700x525"""
+        height, width = frame.shape[:2]
+        scale = min(700 / width, 525 / height, 1.0)
+        size = (max(int(width * scale), 1), max(int(height * scale), 1))
+        preview = self.reg_display.get(*size)
+        cv2.resize(frame, size, dst=preview, interpolation=cv2.INTER_AREA)
+        self.reg_display.show(self.reg_webcam_label)
+
+    def toggle_debug_overlay(self, event=None):
+        self.debug_overlay = not self.debug_overlay
+        metrics.registry.enabled = self.debug_overlay or self.metrics_from_env
+
+    def _draw_debug_overlay(self, frame):
+        for i, line in enumerate(metrics.registry.overlay_lines()):
+            y = 24 + i * 20
+            cv2.putText(frame, line, (10, y), cv2.FONT_HERSHEY_PLAIN, 1.1, (0, 0, 0, 255), 3)
+            cv2.putText(frame, line, (10, y), cv2.FONT_HERSHEY_PLAIN, 1.1, (243, 237, 230, 255), 1)
+
+    def toggle_auto_attendance(self):
+        self.auto_attendance = not self.auto_attendance
+        self.auto_button.config(text='🤖 AUTO CLOCK-IN: ' + ('ON' if self.auto_attendance else 'OFF'))
+
+    def _on_recognized(self, seen, now):
+        """Runs on the recognition worker: turns confirmed identities into clock-in events"""
+        if not self.auto_attendance:
+            return
+        for name in self.debouncer.observe(seen, now):
+            self.attendance_writer.submit(name)
+            self._call_in_ui(lambda name=name: self._show_auto_clock_in(name))
+
+    def _on_liveness(self, name, verdict):
+        """Runs on the recognition worker once per visit, when a matched face gets its liveness verdict"""
+        self._call_in_ui(lambda: self._show_liveness(name, verdict))
+
+    def _show_liveness(self, name, verdict):
+        cost = f"{verdict.cost * 1000:.0f} ms over {verdict.elapsed:.1f}s"
+        if verdict.live:
+            self._update_status(f"Live check passed: {name} ({verdict.reason}, {cost})", "#238636")
+        else:
+            self._update_status(f"Live check failed: {name} ({verdict.reason}, {cost})", "#DA3633")
+        self.mainWindow.after(2000, lambda: self._update_status("Camera Ready", "#238636"))
+
+    def _show_auto_clock_in(self, name):
+        self._update_status(f"Clocked in: {name}", "#238636")
+        self.mainWindow.after(2000, lambda: self._update_status("Camera Ready", "#238636"))
+
     def login(self):
-        if self.most_recent_capture_arr is None: return
+        if self.current_frame is None: return
         
         self._update_status("Processing...", "#FFA657")  # Orange
-        frame = self.most_recent_capture_arr
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        
-        face_locations = face_recognition.face_locations(rgb_frame)
-        face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
+        self.login_button.config(state='disabled')
 
-        if not face_encodings:
-            util.msg_box('⚠️ Alert', "No face detected. Please position yourself in front of the camera.")
+        # The live feed has usually identified the person already
+        names = self.recognizer.identified()
+        if names:
+            self._finish_login(names[0])
             return
 
-        name = "Unknown"
-        match_found = False
-        
-        for face_encoding in face_encodings:
-            if len(self.known_face_encodings) > 0:
-                matches = face_recognition.compare_faces(self.known_face_encodings, face_encoding, tolerance=0.6)
-                face_distances = face_recognition.face_distance(self.known_face_encodings, face_encoding)
-                best_match_index = np.argmin(face_distances)
-                if matches[best_match_index]:
-                    name = self.known_face_names[best_match_index]
-                    match_found = True
+        # Copy out of the frame ring; the buffer is reused by later captures
+        frame = self.current_frame.image.copy()
+        threading.Thread(target=self._login_worker, args=(frame,), daemon=True).start()
+
+    def _login_worker(self, frame):
+        """One-shot recognition for clock-in, off the Tk thread"""
+        try:
+            # Coarse pass plus ROI refinement instead of full-resolution HOG
+            from detector import AdaptiveDetector
+            from batching import encode_batch
+            detections = AdaptiveDetector(default_scale=0.5, motion_threshold=None).detect(frame)
+            face_encodings, _ = encode_batch([(d.image, [d.location]) for d in detections])
+            face_encodings = [found[0] for found in face_encodings]
+
+            if not face_encodings:
+                self._call_in_ui(lambda: self._finish_login(None, face_found=False))
+                return
+
+            name = None
+            for match in self.matcher.match(face_encodings, tolerance=0.6):
+                if match.name is not None:
+                    name = match.name
                     break
 
-        if match_found:
+            # A single still cannot prove liveness; the live feed has to vouch for the person
+            if name is not None and self.recognizer.liveness is not None and name not in self.recognizer.identified():
+                self._call_in_ui(lambda: self._finish_login(None, unverified=name))
+                return
+        except Exception as e:
+            # Always hand back to the UI, or the clock-in button stays disabled
+            self._call_in_ui(lambda error=e: self._finish_login(None, error=error))
+            return
+        self._call_in_ui(lambda: self._finish_login(name))
+
+    def _finish_login(self, name, face_found=True, unverified=None, error=None):
+        self.login_button.config(state='normal')
+
+        if error is not None:
+            self._update_status("Clock-in Failed", "#DA3633")
+            util.msg_box('❌ Error', f"Clock-in failed: {error}")
+            self.mainWindow.after(2000, lambda: self._update_status("Camera Ready", "#238636"))
+            return
+
+        if not face_found:
+            self._update_status("Camera Ready", "#238636")
+            util.msg_box('⚠️ Alert', "No face detected. Please position yourself in front of the camera.")
+            return
+
+        if name is not None:
             self._update_status("Success!", "#238636")  # Green
+            self.attendance_writer.submit(name)
+            self.debouncer.suppress(name, time.monotonic())
             util.msg_box('✅ Success', f'Welcome back, {name}!\nClock-in recorded.')
-            util.log_attendance(name, self.log_path)
-            self._update_log_history()
+            self.mainWindow.after(2000, lambda: self._update_status("Camera Ready", "#238636"))
+        elif unverified is not None:
+            self._update_status("Liveness Not Confirmed", "#DA3633")
+            util.msg_box('❌ Error', f"Could not confirm that {unverified} is present in person.\n"
+                                    "Look at the camera for a moment (blink or move your head) and try again.")
             self.mainWindow.after(2000, lambda: self._update_status("Camera Ready", "#238636"))
         else:
             self._update_status("Not Recognized", "#DA3633")  # Red
@@ -308,28 +539,13 @@ class App:
         
         # Buttons
         util.get_button(form_container, '📸 CAPTURE', '#1F6FEB', self._take_snapshot).pack(fill='x', pady=6, ipady=10)
-        util.get_button(form_container, '💾 SAVE USER', '#238636', self.accept).pack(fill='x', pady=6, ipady=10)
+        self.save_button = util.get_button(form_container, '💾 SAVE USER', '#238636', self.accept)
+        self.save_button.pack(fill='x', pady=6, ipady=10)
         util.get_button(form_container, '❌ CANCEL', '#DA3633', self.deny).pack(fill='x', pady=6, ipady=10)
 
-        self.update_reg_preview()
-
-    def update_reg_preview(self):
-        if not hasattr(self, 'registerWindow') or not self.registerWindow.winfo_exists():
-            return
-
-        if self.most_recent_capture_arr is not None:
-            img = cv2.cvtColor(self.most_recent_capture_arr, cv2.COLOR_BGR2RGB)
-            img_pil = Image.fromarray(img)
-            img_pil.thumbnail((700, 525))
-            imgtk = ImageTk.PhotoImage(image=img_pil)
-            self.reg_webcam_label.imgtk = imgtk
-            self.reg_webcam_label.configure(image=imgtk)
-        
-        self.registerWindow.after(30, self.update_reg_preview)
-
     def _take_snapshot(self):
-        if self.most_recent_capture_arr is None: return
-        self.temp_capture = self.most_recent_capture_arr.copy()
+        if self.current_frame is None: return
+        self.temp_capture = self.current_frame.image.copy()
         img = cv2.cvtColor(self.temp_capture, cv2.COLOR_BGR2RGB)
         img_pil = Image.fromarray(img)
         img_pil.thumbnail((330, 248))
@@ -343,24 +559,73 @@ class App:
             util.msg_box('⚠️ Error', 'Please enter a name.')
             return
         
+        import enroll
+        reason = enroll.check_name(name)
+        if reason is not None:
+            util.msg_box('⚠️ Error', f'Invalid name: {reason}.')
+            return
+
         if self.temp_capture is None:
             util.msg_box('⚠️ Error', 'Please capture a photo first.')
             return
 
-        save_path = os.path.join(self.db_dir, f'{name}.jpg')
-        cv2.imwrite(save_path, self.temp_capture)
+        # Encode and save off the Tk thread; the feed keeps running meanwhile
+        self.save_button.config(state='disabled')
+        self._update_status("Registering...", "#FFA657")
+        self.gallery_jobs.submit(self._register_worker, name, self.temp_capture)
+
+    def _register_worker(self, name, bgr_image):
+        """Runs on the gallery worker: validates and encodes only the snapshot, then hot-swaps it in"""
+        # Registering an existing name adds another template for that person.
+        # The matcher swap is one locked replace: recognition sees either the old or the new templates
+        try:
+            import enroll
+            added, reason = enroll.add_photo(self.store, self.matcher, name, bgr_image)
+            metrics.set_gauge('gallery_size', len(self.matcher))
+        except Exception as e:
+            # Nobody reads this Future: report to the UI so the save button comes back
+            self._call_in_ui(lambda error=e: self._finish_registration(name, error=error))
+            return
+        self._call_in_ui(lambda: self._finish_registration(name, reason=reason, added=added))
 
-        # Reload DB
-        self.known_face_encodings, self.known_face_names = util.load_db(self.db_dir)
+    def _finish_registration(self, name, reason=None, added=False, error=None):
+        self._update_status("Camera Ready", "#238636")
+        window_open = self.registerWindow is not None and self.registerWindow.winfo_exists()
+        if window_open:
+            self.save_button.config(state='normal')
 
-        util.msg_box('✅ Complete', f'User {name} has been successfully registered!')
-        self.registerWindow.destroy()
+        if error is not None:
+            self._update_status("Registration Failed", "#DA3633")
+            util.msg_box('❌ Error', f'Registering {name} failed: {error}')
+            self.mainWindow.after(2000, lambda: self._update_status("Camera Ready", "#238636"))
+            return
+
+        if reason is not None:
+            util.msg_box('⚠️ Error', f'Photo rejected: {reason}.\nPlease retake the photo.')
+            return
+
+        if added:
+            util.msg_box('✅ Complete', f'Added another photo for {name} ({self.matcher.templates(name)} on file).')
+        else:
+            util.msg_box('✅ Complete', f'User {name} has been successfully registered!')
+        if window_open:
+            self.registerWindow.destroy()
         self.temp_capture = None
 
     def deny(self):
         self.registerWindow.destroy()
         self.temp_capture = None
 
+    def close(self):
+        self.gallery_jobs.shutdown(wait=True)
+        self.attendance_writer.stop()
+        if self.pipeline is not None:
+            self.pipeline.stop()
+            self.pipeline.capture.join(timeout=1.0)
+        if self.cap is not None:
+            self.cap.release()
+        self.mainWindow.destroy()
+
     def start(self):
         self.mainWindow.mainloop()
 
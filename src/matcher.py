@@ -0,0 +1,250 @@
+import threading
+import numpy as np
+from collections import namedtuple
+
+ENCODING_DIM = 128
+DEFAULT_TOLERANCE = 0.6
+STRATEGIES = ('min', 'centroid')
+
+# index/name are None when the best candidate is outside the tolerance.
+# margin is the distance gap between the best and second-best identity.
+Match = namedtuple('Match', ['index', 'name', 'distance', 'margin', 'candidates'])
+
+
+class Matcher:
+    """
+    Face gallery held as a contiguous float32 (N, 128) matrix with precomputed
+    squared norms. Every face in a frame is scored against every identity in a
+    single matrix product instead of per-face compare_faces/face_distance calls.
+
+    An identity may own several rows (templates). With strategy='min' it scores
+    as its closest template, with strategy='centroid' as the mean of its
+    templates; either way candidates and margins are per identity.
+
+    An optional approximate index (see ann.IVFIndex) narrows each query to a
+    shortlist of rows, which is then re-ranked exactly. The centroid strategy
+    always scores the (much smaller) centroid matrix exhaustively.
+
+    Mutations and matches hold self.lock, so recognition threads never see a
+    half-updated gallery.
+    """
+    def __init__(self, encodings=(), names=None, capacity=64, strategy='min'):
+        if strategy not in STRATEGIES:
+            raise ValueError('unknown matching strategy: {}'.format(strategy))
+        n = len(encodings)
+        if names is None:
+            names = list(range(n))
+        self.strategy = strategy
+        self._capacity = max(capacity, n)
+        self._matrix = np.zeros((self._capacity, ENCODING_DIM), dtype=np.float32)
+        self._sq_norms = np.zeros(self._capacity, dtype=np.float32)
+        self._size = 0
+        self.names = []
+        self.index = None
+        self.lock = threading.RLock()
+        self._counts = {}
+        self._centroids = None
+        if n > 0:
+            self.extend(names, encodings)
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def matrix(self):
+        return self._matrix[:self._size]
+
+    def _reserve(self, size):
+        if size <= self._capacity:
+            return
+        capacity = max(size, self._capacity * 2)
+        matrix = np.zeros((capacity, ENCODING_DIM), dtype=np.float32)
+        sq_norms = np.zeros(capacity, dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        sq_norms[:self._size] = self._sq_norms[:self._size]
+        self._matrix, self._sq_norms, self._capacity = matrix, sq_norms, capacity
+
+    def set_index(self, index):
+        """Attaches a trained approximate index (or None for brute force) and fills it with the gallery."""
+        with self.lock:
+            if index is not None:
+                index.reset()
+                index.add(np.arange(self._size), self.matrix)
+            self.index = index
+
+    def extend(self, names, encodings):
+        """Appends several encodings in place. Returns the first new row index."""
+        with self.lock:
+            encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+            start = self._size
+            end = start + len(encodings)
+            self._reserve(end)
+            self._matrix[start:end] = encodings
+            self._sq_norms[start:end] = np.einsum('ij,ij->i', encodings, encodings)
+            self.names.extend(names)
+            for name in names:
+                self._counts[name] = self._counts.get(name, 0) + 1
+            self._size = end
+            self._centroids = None
+            if self.index is not None:
+                self.index.add(np.arange(start, end), encodings)
+            return start
+
+    def add(self, name, encoding):
+        """Appends one encoding in place. Returns its row index."""
+        return self.extend([name], [encoding])
+
+    def remove(self, name):
+        """Removes every row labelled name by swapping in the last row. Returns the number removed."""
+        with self.lock:
+            removed = 0
+            i = 0
+            while i < self._size:
+                if self.names[i] != name:
+                    i += 1
+                    continue
+                last = self._size - 1
+                if self.index is not None:
+                    self.index.remove(i)
+                    if i != last:
+                        self.index.move(last, i)
+                if i != last:
+                    self._matrix[i] = self._matrix[last]
+                    self._sq_norms[i] = self._sq_norms[last]
+                    self.names[i] = self.names[last]
+                self.names.pop()
+                self._size = last
+                removed += 1
+            if removed:
+                del self._counts[name]
+                self._centroids = None
+            return removed
+
+    def replace(self, name, encodings):
+        """Atomically swaps every template of name for encodings."""
+        with self.lock:
+            self.remove(name)
+            if len(encodings):
+                self.extend([name] * len(encodings), encodings)
+
+    def _max_templates(self):
+        return max(self._counts.values(), default=1)
+
+    def templates(self, name):
+        """Number of rows labelled name."""
+        return self._counts.get(name, 0)
+
+    def distances(self, face_encodings):
+        """Euclidean distances as an (F, N) matrix, one row per query face."""
+        queries = np.asarray(face_encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        if self._size == 0 or len(queries) == 0:
+            return np.empty((len(queries), self._size), dtype=np.float32)
+        q_sq = np.einsum('ij,ij->i', queries, queries)
+        sq = q_sq[:, None] + self._sq_norms[None, :self._size] - 2.0 * (queries @ self.matrix.T)
+        np.maximum(sq, 0, out=sq)
+        return np.sqrt(sq, out=sq)
+
+    def _top_k_indexed(self, face_encodings, k):
+        """Exact re-ranking of the approximate index shortlist, padded with (-1, inf)."""
+        queries = np.asarray(face_encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        indices = np.full((len(queries), k), -1, dtype=np.intp)
+        dists = np.full((len(queries), k), np.inf, dtype=np.float32)
+        for i, (query, rows) in enumerate(zip(queries, self.index.shortlist(queries))):
+            if len(rows) == 0:
+                continue
+            sq = float(query @ query) + self._sq_norms[rows] - 2.0 * (self._matrix[rows] @ query)
+            d = np.sqrt(np.maximum(sq, 0))
+            kk = min(k, len(rows))
+            best = np.argpartition(d, kk - 1)[:kk] if kk < len(rows) else np.arange(len(rows))
+            best = best[np.argsort(d[best])]
+            indices[i, :kk] = rows[best]
+            dists[i, :kk] = d[best]
+        return indices, dists
+
+    def top_k(self, face_encodings, k=2):
+        """Returns (indices, distances), both (F, k'), sorted by ascending distance."""
+        k = min(k, self._size)
+        if self.index is not None and k > 0:
+            return self._top_k_indexed(face_encodings, k)
+        dist = self.distances(face_encodings)
+        if k == 0:
+            empty = np.empty((len(dist), 0))
+            return empty.astype(np.intp), empty.astype(np.float32)
+        if k < self._size:
+            idx = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        else:
+            idx = np.broadcast_to(np.arange(self._size), dist.shape).copy()
+        part = np.take_along_axis(dist, idx, axis=1)
+        order = np.argsort(part, axis=1)
+        return np.take_along_axis(idx, order, axis=1), np.take_along_axis(part, order, axis=1)
+
+    def _centroid_matrix(self):
+        """(names, first row of each, centroids, squared norms), rebuilt after any mutation."""
+        if self._centroids is None:
+            ids = {}
+            labels = np.fromiter((ids.setdefault(name, len(ids)) for name in self.names),
+                                 dtype=np.intp, count=self._size)
+            order = np.argsort(labels, kind='stable')
+            starts = np.searchsorted(labels[order], np.arange(len(ids)))
+            if len(ids):
+                sums = np.add.reduceat(self.matrix[order], starts, axis=0)
+                centroids = (sums / np.bincount(labels)[:, None]).astype(np.float32)
+            else:
+                centroids = np.empty((0, ENCODING_DIM), dtype=np.float32)
+            self._centroids = (list(ids), order[starts], centroids, np.einsum('ij,ij->i', centroids, centroids))
+        return self._centroids
+
+    def _top_identities(self, face_encodings, k):
+        """
+        Per query, the k best distinct identities as (rows, names, distances),
+        sorted by ascending distance.
+        """
+        if self.strategy == 'centroid':
+            names, first_rows, centroids, sq_norms = self._centroid_matrix()
+            queries = np.asarray(face_encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+            kk = min(k, len(names))
+            if kk == 0:
+                return [([], [], [])] * len(queries)
+            sq = np.einsum('ij,ij->i', queries, queries)[:, None] + sq_norms[None, :] - 2.0 * (queries @ centroids.T)
+            dist = np.sqrt(np.maximum(sq, 0))
+            idx = np.argpartition(dist, kk - 1, axis=1)[:, :kk] if kk < len(names) else \
+                np.broadcast_to(np.arange(len(names)), dist.shape)
+            part = np.take_along_axis(dist, idx, axis=1)
+            order = np.argsort(part, axis=1)
+            idx, part = np.take_along_axis(idx, order, axis=1), np.take_along_axis(part, order, axis=1)
+            return [([int(first_rows[i]) for i in row], [names[i] for i in row], list(map(float, d)))
+                    for row, d in zip(idx, part)]
+
+        # min: each identity owns at most max_templates rows, so the top
+        # k * max_templates rows always contain the k best distinct identities
+        indices, dists = self.top_k(face_encodings, k=k * self._max_templates())
+        results = []
+        for row_idx, row_dist in zip(indices, dists):
+            rows, names, distances = [], [], []
+            for i, d in zip(row_idx, row_dist):
+                if not np.isfinite(d) or self.names[i] in names:
+                    continue
+                rows.append(int(i))
+                names.append(self.names[i])
+                distances.append(float(d))
+                if len(rows) == k:
+                    break
+            results.append((rows, names, distances))
+        return results
+
+    def match(self, face_encodings, tolerance=DEFAULT_TOLERANCE, k=2):
+        """Matches every face against the gallery. Returns one Match per face."""
+        with self.lock:
+            results = []
+            for row_idx, row_names, row_dist in self._top_identities(face_encodings, max(k, 2)):
+                candidates = list(zip(row_names[:k], row_dist[:k]))
+                if len(row_idx) == 0:
+                    results.append(Match(None, None, float('inf'), float('inf'), candidates))
+                    continue
+                best = row_dist[0]
+                margin = row_dist[1] - best if len(row_dist) > 1 else float('inf')
+                if best <= tolerance:
+                    results.append(Match(row_idx[0], row_names[0], best, margin, candidates))
+                else:
+                    results.append(Match(None, None, best, margin, candidates))
+            return results
@@ -0,0 +1,215 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Prometheus histogram bucket bounds, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class _NullTimer:
+    """Shared do-nothing timer handed out while metrics are disabled."""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ('registry', 'stage', 'start')
+
+    def __init__(self, registry, stage):
+        self.registry = registry
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class Histogram:
+    """Cumulative Prometheus-style buckets plus a rolling window for percentiles."""
+    def __init__(self, window):
+        self.bucket_counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.sum += seconds
+        self.recent.append(seconds)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.bucket_counts[i] += 1
+                break
+
+    def percentile(self, q):
+        recent = sorted(self.recent)
+        if not recent:
+            return 0.0
+        return recent[min(len(recent) - 1, int(len(recent) * q))]
+
+
+class Metrics:
+    """
+    Stage timers, counters and gauges. While disabled, timer() returns a shared
+    no-op and inc()/observe() return immediately. Gauges are always recorded:
+    they are set rarely (startup, gallery changes) and would otherwise stay
+    missing after metrics are switched on later.
+    """
+    def __init__(self, enabled=False, window=500):
+        self.enabled = enabled
+        self.window = window
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self._lock = threading.Lock()
+
+    def timer(self, stage):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, stage)
+
+    def observe(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram(self.window)
+            histogram.observe(seconds)
+
+    def inc(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def summary(self):
+        """Rolling p50/p95/p99 per stage in ms, plus counters and gauges."""
+        with self._lock:
+            stages = {stage: {'p50_ms': h.percentile(0.5) * 1000, 'p95_ms': h.percentile(0.95) * 1000,
+                              'p99_ms': h.percentile(0.99) * 1000, 'count': h.count}
+                      for stage, h in self.histograms.items()}
+            return {'stages': stages, 'counters': dict(self.counters), 'gauges': dict(self.gauges)}
+
+    def prometheus_text(self):
+        """Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            lines.append('# TYPE attendance_stage_seconds histogram')
+            for stage, h in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS, h.bucket_counts):
+                    cumulative += count
+                    lines.append('attendance_stage_seconds_bucket{{stage="{}",le="{}"}} {}'.format(stage, bound, cumulative))
+                lines.append('attendance_stage_seconds_bucket{{stage="{}",le="+Inf"}} {}'.format(stage, h.count))
+                lines.append('attendance_stage_seconds_sum{{stage="{}"}} {}'.format(stage, h.sum))
+                lines.append('attendance_stage_seconds_count{{stage="{}"}} {}'.format(stage, h.count))
+            for name, value in sorted(self.counters.items()):
+                lines.append('# TYPE attendance_{}_total counter'.format(name))
+                lines.append('attendance_{}_total {}'.format(name, value))
+            for name, value in sorted(self.gauges.items()):
+                lines.append('# TYPE attendance_{} gauge'.format(name))
+                lines.append('attendance_{} {}'.format(name, value))
+        return '\n'.join(lines) + '\n'
+
+    def overlay_lines(self):
+        """Short text lines for the on-screen debug overlay."""
+        summary = self.summary()
+        lines = ['{:<10} p50 {:6.1f}  p95 {:6.1f} ms'.format(stage, s['p50_ms'], s['p95_ms'])
+                 for stage, s in sorted(summary['stages'].items())]
+        lines += ['{} {}'.format(name, value) for name, value in sorted(summary['counters'].items())]
+        lines += ['{} {}'.format(name, value) for name, value in sorted(summary['gauges'].items())]
+        return lines
+
+
+registry = Metrics()
+
+
+def timer(stage):
+    return registry.timer(stage)
+
+
+def observe(stage, seconds):
+    registry.observe(stage, seconds)
+
+
+def inc(name, n=1):
+    registry.inc(name, n)
+
+
+def set_gauge(name, value):
+    registry.set_gauge(name, value)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/metrics':
+            body, content_type = registry.prometheus_text(), 'text/plain; version=0.0.4'
+        elif self.path == '/metrics.json':
+            body, content_type = json.dumps(registry.summary()), 'application/json'
+        else:
+            self.send_error(404)
+            return
+        data = body.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, host='127.0.0.1'):
+    """Serves /metrics (Prometheus text) and /metrics.json on a local port from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def dump_periodically(path, interval=10.0):
+    """Writes the JSON summary to path every interval seconds from a daemon thread."""
+    def run():
+        while True:
+            time.sleep(interval)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(registry.summary(), f, indent=2)
+            os.replace(tmp_path, path)
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def configure_from_env():
+    """
+    Enables metrics from the environment:
+    ATTENDANCE_METRICS=1, ATTENDANCE_METRICS_PORT=<port>, ATTENDANCE_METRICS_JSON=<path>.
+    A port or JSON path implies enabled.
+    """
+    port = os.environ.get('ATTENDANCE_METRICS_PORT')
+    json_path = os.environ.get('ATTENDANCE_METRICS_JSON')
+    registry.enabled = bool(os.environ.get('ATTENDANCE_METRICS') == '1' or port or json_path)
+    if port:
+        serve(int(port))
+    if json_path:
+        dump_periodically(json_path)
+    return registry.enabled
@@ -0,0 +1,314 @@
+import os
+import sys
+import time
+import queue
+import traceback
+import argparse
+import threading
+import multiprocessing as mp
+from multiprocessing import shared_memory, resource_tracker
+from collections import deque
+import numpy as np
+import cv2
+import util
+from encoding_store import EncodingStore
+from matcher import Matcher
+
+# Frames in flight per camera. When every slot is busy new frames are dropped,
+# so a slow pool never builds a backlog of stale frames.
+SLOTS_PER_CAMERA = 2
+
+
+def parse_source(source):
+    """Device indices are given as digits; anything else is a file path or stream URL."""
+    return int(source) if source.isdigit() else source
+
+
+def _attach_shared_memory(name):
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    # Before 3.13 attaching registers the block with the resource tracker,
+    # which would unlink it when this worker exits. The owner unlinks it.
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+def _worker_main(db_path, tasks, results, free_slots, max_batch=4, gallery_path=None):
+    """
+    Recognition process: loads its own dlib models and gallery, then reads
+    frames straight out of the cameras' shared memory blocks. Frames already
+    waiting (from any camera) are encoded and matched together as one batch.
+    With gallery_path the gallery is a memory-mapped compact export that all
+    workers share instead of a private float32 copy each.
+    """
+    if gallery_path is not None:
+        from quantized import QuantizedGallery
+        matcher = QuantizedGallery(gallery_path)
+    else:
+        store = EncodingStore(db_path)
+        matcher = Matcher(store.encodings(), store.names())
+    attached = {}
+    running = True
+
+    while running:
+        task = tasks.get()
+        if task is None:
+            break
+        batch = [task]
+        while len(batch) < max_batch:
+            try:
+                task = tasks.get_nowait()
+            except queue.Empty:
+                break
+            if task is None:
+                running = False
+                break
+            batch.append(task)
+
+        frames = []
+        faces_per_frame = None
+        try:
+            for camera_id, shm_name, slot, shape, frame_id, captured_at in batch:
+                shm = attached.get(shm_name)
+                if shm is None:
+                    shm = attached[shm_name] = _attach_shared_memory(shm_name)
+                frames.append(np.ndarray((SLOTS_PER_CAMERA,) + shape, dtype=np.uint8, buffer=shm.buf)[slot])
+
+            start = time.time()
+            faces_per_frame = util.recognize_frames(frames, matcher)
+            elapsed = time.time() - start
+        except Exception:
+            # One bad batch is dropped; the worker keeps serving every camera
+            print('Worker {}: batch of {} frames failed:'.format(os.getpid(), len(batch)), flush=True)
+            traceback.print_exc()
+        finally:
+            # The slots always go back, or their camera runs out and drops every frame
+            del frames
+            for camera_id, _, slot, _, _, _ in batch:
+                free_slots[camera_id].put(slot)
+
+        if faces_per_frame is not None:
+            for (camera_id, _, _, _, frame_id, captured_at), faces in zip(batch, faces_per_frame):
+                results.put((camera_id, frame_id, faces, captured_at, elapsed))
+
+    for shm in attached.values():
+        shm.close()
+
+
+class CameraStats:
+    def __init__(self, window=300):
+        self.captured = 0
+        self.dropped = 0
+        self.processed = 0
+        self.recognized = 0
+        self.latencies = deque(maxlen=window)
+        self.completed_at = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def snapshot(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            done = list(self.completed_at)
+            snap = {'captured': self.captured, 'dropped': self.dropped,
+                    'processed': self.processed, 'recognized': self.recognized}
+        span = done[-1] - done[0] if len(done) > 1 else 0.0
+        snap['fps'] = (len(done) - 1) / span if span > 0 else 0.0
+        snap['latency_p50_ms'] = latencies[len(latencies) // 2] * 1000 if latencies else 0.0
+        snap['latency_p95_ms'] = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0.0
+        return snap
+
+
+class CameraFeed(threading.Thread):
+    """Reads one source and copies frames into a free shared memory slot for the pool."""
+    def __init__(self, camera_id, source, tasks, free_slots, stats):
+        super().__init__(daemon=True)
+        self.camera_id = camera_id
+        self.source = source
+        self.tasks = tasks
+        self.free_slots = free_slots
+        self.stats = stats
+        self.shm = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        cap = cv2.VideoCapture(self.source)
+        ret, frame = cap.read()
+        if not ret:
+            print('Camera {}: cannot read from {!r}'.format(self.camera_id, self.source))
+            return
+
+        shape = frame.shape
+        self.shm = shared_memory.SharedMemory(create=True, size=SLOTS_PER_CAMERA * frame.nbytes)
+        frames = np.ndarray((SLOTS_PER_CAMERA,) + shape, dtype=np.uint8, buffer=self.shm.buf)
+        for slot in range(SLOTS_PER_CAMERA):
+            self.free_slots.put(slot)
+
+        # Video files are paced at their native rate; live sources pace themselves
+        is_file = isinstance(self.source, str) and os.path.isfile(self.source)
+        frame_interval = 1.0 / (cap.get(cv2.CAP_PROP_FPS) or 30.0) if is_file else 0.0
+        frame_id = 0
+
+        while not self._stop_event.is_set():
+            if frame_id > 0:
+                ret, frame = cap.read()
+                if not ret:
+                    if is_file:
+                        break
+                    time.sleep(0.01)
+                    continue
+            frame_id += 1
+            captured_at = time.time()
+            with self.stats.lock:
+                self.stats.captured += 1
+
+            try:
+                slot = self.free_slots.get_nowait()
+            except queue.Empty:
+                with self.stats.lock:
+                    self.stats.dropped += 1
+            else:
+                if frame.shape != shape:
+                    frame = cv2.resize(frame, (shape[1], shape[0]))
+                frames[slot] = frame
+                self.tasks.put((self.camera_id, self.shm.name, slot, shape, frame_id, captured_at))
+
+            if frame_interval:
+                time.sleep(max(0.0, frame_interval - (time.time() - captured_at)))
+
+        cap.release()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def release(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+class RecognitionService:
+    """
+    Headless multi-camera recognition: one capture thread per source fans
+    frames out through shared memory to a pool of worker processes, each with
+    its own dlib models. Recognized people are logged with a per-person cooldown.
+    """
+    def __init__(self, sources, db_path='./db', log_path='./attendance.db', workers=None, cooldown=60.0,
+                 gallery_dtype=None):
+        self.db_path = db_path
+        self.gallery_dtype = gallery_dtype
+        self.gallery_path = None
+        self.log_path = log_path
+        self.cooldown = cooldown
+        self.n_workers = workers or os.cpu_count() or 1
+
+        self.tasks = mp.Queue()
+        self.results = mp.Queue()
+        self.free_slots = [mp.Queue() for _ in sources]
+        self.stats = [CameraStats() for _ in sources]
+        self.feeds = [CameraFeed(i, source, self.tasks, self.free_slots[i], self.stats[i])
+                      for i, source in enumerate(sources)]
+        self.workers = []
+        self.last_logged = {}
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._running = False
+
+    def start(self):
+        # Bring the cache up to date once so workers only read it
+        store = EncodingStore(self.db_path)
+        store.sync()
+        if self.gallery_dtype is not None:
+            from quantized import export_store
+            self.gallery_path = export_store(store, self.gallery_dtype)
+
+        self._running = True
+        for _ in range(self.n_workers):
+            worker = mp.Process(target=_worker_main, args=(self.db_path, self.tasks, self.results, self.free_slots),
+                                kwargs={'gallery_path': self.gallery_path}, daemon=True)
+            worker.start()
+            self.workers.append(worker)
+        self._collector.start()
+        for feed in self.feeds:
+            feed.start()
+
+    def _collect(self):
+        while self._running:
+            try:
+                camera_id, frame_id, faces, captured_at, elapsed = self.results.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            now = time.time()
+            stats = self.stats[camera_id]
+            names = [face[4] for face in faces if face[4] != "Unknown"]
+            with stats.lock:
+                stats.processed += 1
+                stats.recognized += len(names)
+                stats.latencies.append(now - captured_at)
+                stats.completed_at.append(now)
+
+            for name in names:
+                if now - self.last_logged.get(name, 0.0) >= self.cooldown:
+                    self.last_logged[name] = now
+                    util.log_attendance(name, self.log_path)
+
+    def running(self):
+        return any(feed.is_alive() for feed in self.feeds)
+
+    def report(self):
+        return [dict(camera=i, source=str(feed.source), **stats.snapshot())
+                for i, (feed, stats) in enumerate(zip(self.feeds, self.stats))]
+
+    def stop(self):
+        for feed in self.feeds:
+            feed.stop()
+        for feed in self.feeds:
+            feed.join(timeout=2.0)
+        for _ in self.workers:
+            self.tasks.put(None)
+        for worker in self.workers:
+            worker.join(timeout=5.0)
+        self._running = False
+        self._collector.join(timeout=1.0)
+        for feed in self.feeds:
+            feed.release()
+
+
+def format_report(report):
+    lines = []
+    for cam in report:
+        lines.append('cam {camera} [{source}] {fps:.1f} fps | latency p50 {latency_p50_ms:.0f} ms '
+                     'p95 {latency_p95_ms:.0f} ms | captured {captured} dropped {dropped} '
+                     'processed {processed} recognized {recognized}'.format(**cam))
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless multi-camera recognition service.')
+    parser.add_argument('--source', action='append', required=True,
+                        help='camera index, video file or stream URL (repeat for several cameras)')
+    parser.add_argument('--workers', type=int, default=0, help='recognition processes (default: CPU count)')
+    parser.add_argument('--db', default='./db')
+    parser.add_argument('--log', default='./attendance.db', help='attendance store')
+    parser.add_argument('--cooldown', type=float, default=60.0, help='seconds between logs of the same person')
+    parser.add_argument('--stats-interval', type=float, default=5.0)
+    parser.add_argument('--gallery', choices=('float32', 'float16', 'int8'),
+                        help='share one memory-mapped gallery of this dtype between workers')
+    args = parser.parse_args()
+
+    service = RecognitionService([parse_source(s) for s in args.source], args.db, args.log,
+                                 workers=args.workers or None, cooldown=args.cooldown, gallery_dtype=args.gallery)
+    service.start()
+    try:
+        while service.running():
+            time.sleep(args.stats_interval)
+            print(format_report(service.report()), flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+    print(format_report(service.report()))
+
+
+if __name__ == '__main__':
+    main()
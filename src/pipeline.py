@@ -0,0 +1,296 @@
+import time
+import threading
+import traceback
+from collections import deque
+import metrics
+
+
+class DropOldestQueue:
+    """
+    Bounded queue that never blocks the producer: when full, the oldest item
+    is discarded in favour of the new one. With maxsize=1 it is a "latest
+    value" mailbox. on_drop, if set, is called with every discarded item.
+    """
+    def __init__(self, maxsize=1, on_drop=None):
+        self._items = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self.on_drop = on_drop
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+                metrics.inc('frames_dropped')
+                if self.on_drop is not None:
+                    self.on_drop(self._items[0])
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Takes the oldest remaining item, or returns None on timeout."""
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def clear(self):
+        with self._cond:
+            if self.on_drop is not None:
+                for item in self._items:
+                    self.on_drop(item)
+            self._items.clear()
+
+
+class FrameRing:
+    """
+    Preallocated frame buffers shared by capture, recognition and display.
+    Slots are reference counted and the camera is only read into a slot nobody
+    holds, so once every slot has been filled no frame is allocated again.
+    """
+    def __init__(self, slots):
+        self.buffers = [None] * slots
+        self.refs = [0] * slots
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Index of a free slot, held once by the caller, or None if every slot is in use."""
+        with self._lock:
+            for i in range(len(self.refs)):
+                slot = (self._next + i) % len(self.refs)
+                if self.refs[slot] == 0:
+                    self.refs[slot] = 1
+                    self._next = slot + 1
+                    return slot
+            return None
+
+    def retain(self, slot):
+        with self._lock:
+            self.refs[slot] += 1
+
+    def release(self, slot):
+        with self._lock:
+            self.refs[slot] -= 1
+
+
+class Frame:
+    """
+    A captured image. Ring-backed frames must be released by whoever holds
+    them; the buffer is overwritten by a later capture afterwards.
+    """
+    __slots__ = ('id', 'timestamp', 'image', 'ring', 'slot')
+
+    def __init__(self, id, timestamp, image, ring=None, slot=None):
+        self.id = id
+        self.timestamp = timestamp
+        self.image = image
+        self.ring = ring
+        self.slot = slot
+
+    def retain(self):
+        if self.ring is not None:
+            self.ring.retain(self.slot)
+        return self
+
+    def release(self):
+        if self.ring is not None:
+            self.ring.release(self.slot)
+
+
+class CaptureThread(threading.Thread):
+    """
+    Reads the camera as fast as it delivers, into ring buffers, and publishes
+    every frame to the display and the recognition queue.
+    """
+    def __init__(self, cap, queue, ring):
+        super().__init__(daemon=True)
+        self.cap = cap
+        self.queue = queue
+        self.ring = ring
+        self.frames_read = 0
+        self._latest = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            slot = self.ring.acquire()
+            if slot is None:
+                # Every buffer is held; keep the camera drained without publishing
+                metrics.inc('ring_exhausted')
+                self.cap.grab()
+                continue
+            with metrics.timer('capture'):
+                ret, image = self.cap.read(self.ring.buffers[slot])
+            if not ret:
+                self.ring.release(slot)
+                time.sleep(0.01)
+                continue
+            # read() reuses the buffer when the shape matches, so this only changes on the first fill
+            self.ring.buffers[slot] = image
+            self.frames_read += 1
+            frame = Frame(self.frames_read, time.monotonic(), image, self.ring, slot)
+            # The acquire reference belongs to _latest, this one to the queue
+            frame.retain()
+            with self._lock:
+                previous, self._latest = self._latest, frame
+            if previous is not None:
+                previous.release()
+            self.queue.put(frame)
+
+    def latest(self):
+        """Newest frame, retained for the caller (release() it when done), or None."""
+        with self._lock:
+            return self._latest.retain() if self._latest is not None else None
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class RecognitionWorker(threading.Thread):
+    """
+    Pulls the newest frame, runs recognize_fn on it and publishes the result.
+
+    Cadence adapts to measured throughput: the worker sleeps between runs so
+    that recognition uses at most duty_cycle of its thread's time, instead of
+    running on a fixed frame count. If track_fn is given, the idle time is
+    spent running it on fresh frames (e.g. moving boxes with optical flow).
+
+    An exception from recognize_fn or track_fn skips that frame but does not
+    end the worker: it is counted in errors (and recognition_errors) and its
+    traceback printed whenever the error type changes.
+    """
+    def __init__(self, queue, recognize_fn, duty_cycle=0.5, track_fn=None):
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.recognize_fn = recognize_fn
+        self.track_fn = track_fn
+        self.duty_cycle = duty_cycle
+        self.latency = 0.0
+        self.processed = 0
+        self.errors = 0
+        self._last_error = None
+        self._result = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            frame = self.queue.get(timeout=0.1)
+            if frame is None:
+                continue
+
+            start = time.monotonic()
+            try:
+                faces = self.recognize_fn(frame.image)
+            except Exception as e:
+                self._failed(e)
+                continue
+            finally:
+                frame.release()
+            elapsed = time.monotonic() - start
+
+            # Exponential moving average of the recognition latency
+            self.latency = elapsed if self.processed == 0 else 0.8 * self.latency + 0.2 * elapsed
+            self.processed += 1
+            metrics.observe('recognize', elapsed)
+            metrics.inc('frames_recognized')
+            with self._lock:
+                self._result = (frame.id, faces)
+
+            idle = self.latency * (1.0 - self.duty_cycle) / self.duty_cycle
+            if idle > 0:
+                self._idle(time.monotonic() + idle)
+                # Whatever arrived while idle is stale; recognize the next fresh frame
+                self.queue.clear()
+
+    def _idle(self, deadline):
+        if self.track_fn is None:
+            self._stop_event.wait(deadline - time.monotonic())
+            return
+        while not self._stop_event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            frame = self.queue.get(timeout=remaining)
+            if frame is not None:
+                with metrics.timer('track'):
+                    try:
+                        faces = self.track_fn(frame.image)
+                    except Exception as e:
+                        self._failed(e)
+                        continue
+                    finally:
+                        frame.release()
+                with self._lock:
+                    self._result = (frame.id, faces)
+
+    def _failed(self, error):
+        """Counts a failed frame; a bad crop or a model error must not stop recognition for the session."""
+        self.errors += 1
+        metrics.inc('recognition_errors')
+        if type(error) is not self._last_error:
+            self._last_error = type(error)
+            traceback.print_exc()
+
+    def result(self):
+        """Latest (frame id, faces) or None before the first run."""
+        with self._lock:
+            return self._result
+
+    @property
+    def fps(self):
+        return self.duty_cycle / self.latency if self.latency > 0 else 0.0
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class RecognitionPipeline:
+    """
+    capture thread -> bounded drop-oldest queue -> recognition worker(s) -> latest result,
+    with frames living in a shared FrameRing. Without recognize_fn it is a
+    preview-only pipeline until enable_recognition() is called.
+    """
+    def __init__(self, cap, recognize_fn=None, workers=1, duty_cycle=0.5, track_fn=None):
+        self.n_workers = workers
+        self.duty_cycle = duty_cycle
+        # One slot per worker, plus the queued frame, the latest frame, the one
+        # being captured and the one on screen
+        self.ring = FrameRing(workers + 4)
+        self.queue = DropOldestQueue(maxsize=1, on_drop=Frame.release)
+        self.capture = CaptureThread(cap, self.queue, self.ring)
+        self.workers = []
+        if recognize_fn is not None:
+            self.workers = [RecognitionWorker(self.queue, recognize_fn, duty_cycle, track_fn) for _ in range(workers)]
+
+    def start(self):
+        self.capture.start()
+        for worker in self.workers:
+            worker.start()
+
+    def enable_recognition(self, recognize_fn, track_fn=None):
+        """Starts the recognition workers of a running preview-only pipeline."""
+        workers = [RecognitionWorker(self.queue, recognize_fn, self.duty_cycle, track_fn) for _ in range(self.n_workers)]
+        for worker in workers:
+            worker.start()
+        self.workers = workers
+
+    def stop(self):
+        self.capture.stop()
+        for worker in self.workers:
+            worker.stop()
+
+    def latest_frame(self):
+        """Newest frame, retained for the caller; release() it when done."""
+        return self.capture.latest()
+
+    def latest_result(self):
+        """Newest result across all workers, or None."""
+        results = [r for r in (w.result() for w in self.workers) if r is not None]
+        if not results:
+            return None
+        return max(results, key=lambda r: r[0])
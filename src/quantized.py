@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+from matcher import Matcher, ENCODING_DIM, DEFAULT_TOLERANCE
+
+DTYPES = ('float32', 'float16', 'int8')
+GALLERY_DIRNAME = '.gallery.{}'
+CHUNK_ROWS = 65536
+
+
+def quantize(encodings, dtype):
+    """
+    Returns (codes, scale, offset) with encodings ~= codes * scale + offset per
+    dimension. int8 codes span [-127, 127] over each dimension's range; float
+    dtypes are a plain cast with scale 1 and offset 0.
+    """
+    encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+    if dtype != 'int8':
+        return encodings.astype(dtype), np.ones(ENCODING_DIM, np.float32), np.zeros(ENCODING_DIM, np.float32)
+    if len(encodings) == 0:
+        return np.zeros((0, ENCODING_DIM), np.int8), np.ones(ENCODING_DIM, np.float32), np.zeros(ENCODING_DIM, np.float32)
+    low, high = encodings.min(axis=0), encodings.max(axis=0)
+    offset = (high + low) / 2
+    scale = np.maximum((high - low) / 254, 1e-12).astype(np.float32)
+    codes = np.clip(np.rint((encodings - offset) / scale), -127, 127).astype(np.int8)
+    return codes, scale, offset.astype(np.float32)
+
+
+def _dequantize(codes, scale, offset):
+    return codes.astype(np.float32) * scale + offset
+
+
+def write_gallery(path, names, encodings, dtype='int8'):
+    """
+    Writes a compact gallery directory: codes, squared norms and names as .npy
+    files that load memory-mapped, plus meta.json (written last).
+    """
+    if dtype not in DTYPES:
+        raise ValueError('unknown gallery dtype: {}'.format(dtype))
+    os.makedirs(path, exist_ok=True)
+    codes, scale, offset = quantize(encodings, dtype)
+    sq_norms = np.empty(len(codes), dtype=np.float32)
+    for start in range(0, len(codes), CHUNK_ROWS):
+        block = _dequantize(codes[start:start + CHUNK_ROWS], scale, offset)
+        sq_norms[start:start + CHUNK_ROWS] = np.einsum('ij,ij->i', block, block)
+
+    # Names as one UTF-8 blob plus offsets, so they are shared and cost no Python objects
+    encoded = [str(name).encode('utf-8') for name in names]
+    name_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    name_offsets[1:] = np.cumsum([len(e) for e in encoded])
+    counts = {}
+    for name in names:
+        counts[name] = counts.get(name, 0) + 1
+
+    arrays = {'codes': codes, 'sq_norms': sq_norms, 'scale': scale, 'offset': offset,
+              'name_offsets': name_offsets, 'name_blob': np.frombuffer(b''.join(encoded), dtype=np.uint8)}
+    for key, array in arrays.items():
+        tmp_path = os.path.join(path, key + '.npy.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp_path, os.path.join(path, key + '.npy'))
+    meta = {'dtype': dtype, 'count': len(codes), 'max_templates': max(counts.values(), default=1),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    with open(os.path.join(path, 'meta.json.tmp'), 'w') as f:
+        json.dump(meta, f)
+    os.replace(os.path.join(path, 'meta.json.tmp'), os.path.join(path, 'meta.json'))
+    return path
+
+
+def export_store(store, dtype='int8', path=None):
+    """Writes the encodings of an EncodingStore as a compact gallery next to its images."""
+    path = path or os.path.join(store.db_path, GALLERY_DIRNAME.format(dtype))
+    return write_gallery(path, store.names(), store.encodings(), dtype)
+
+
+class _NameTable:
+    """Read-only sequence of names decoded on access from a memory-mapped UTF-8 blob."""
+    def __init__(self, blob, offsets):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self._blob[self._offsets[i]:self._offsets[i + 1]]).decode('utf-8')
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __contains__(self, name):
+        return any(n == name for n in self)
+
+
+class QuantizedGallery(Matcher):
+    """
+    Read-only Matcher over a compact gallery written by write_gallery(). All
+    arrays are memory-mapped, so every process that opens the same directory
+    shares one physical copy through the page cache. Distances are computed
+    in chunks on dequantized rows; int8 codes are never expanded in full.
+    """
+    def __init__(self, path, strategy='min'):
+        super().__init__(capacity=0, strategy=strategy)
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+
+        def load(key):
+            return np.load(os.path.join(path, key + '.npy'), mmap_mode='r')
+
+        self.path = path
+        self._matrix = load('codes')
+        self._sq_norms = load('sq_norms')
+        self._scale = np.asarray(load('scale'))
+        self._offset = np.asarray(load('offset'))
+        self._size = len(self._matrix)
+        self._capacity = self._size
+        self.names = _NameTable(load('name_blob'), load('name_offsets'))
+        if self._size != self.meta['count'] or len(self.names) != self._size:
+            raise ValueError('incomplete gallery at {}'.format(path))
+
+    @property
+    def matrix(self):
+        # Materializes float32 rows; only the centroid strategy needs this
+        return _dequantize(self._matrix, self._scale, self._offset)
+
+    @property
+    def nbytes(self):
+        return self._matrix.nbytes + self._sq_norms.nbytes
+
+    def _max_templates(self):
+        return self.meta['max_templates']
+
+    def templates(self, name):
+        return sum(n == name for n in self.names)
+
+    def distances(self, face_encodings):
+        queries = np.asarray(face_encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        out = np.empty((len(queries), self._size), dtype=np.float32)
+        if self._size == 0 or len(queries) == 0:
+            return out
+        # q . (c * scale + offset) = (q * scale) . c + q . offset
+        scaled = queries * self._scale
+        q_offset = queries @ self._offset
+        q_sq = np.einsum('ij,ij->i', queries, queries)
+        for start in range(0, self._size, CHUNK_ROWS):
+            end = min(start + CHUNK_ROWS, self._size)
+            block = self._matrix[start:end].astype(np.float32)
+            out[:, start:end] = q_sq[:, None] + self._sq_norms[start:end] - 2.0 * (scaled @ block.T + q_offset[:, None])
+        np.maximum(out, 0, out=out)
+        return np.sqrt(out, out=out)
+
+    def set_index(self, index):
+        raise TypeError('quantized galleries are searched exhaustively')
+
+    def extend(self, names, encodings):
+        raise TypeError('quantized galleries are read-only; re-export after enrolling')
+
+    def remove(self, name):
+        raise TypeError('quantized galleries are read-only; re-export after removing')
+
+
+def _float64_distances(encodings, sq_norms, queries):
+    sq = np.einsum('ij,ij->i', queries, queries)[:, None] + sq_norms[None, :] - 2.0 * (queries @ encodings.T)
+    return np.sqrt(np.maximum(sq, 0))
+
+
+def accuracy_report(encodings, names, queries, tolerance=DEFAULT_TOLERANCE, dtypes=DTYPES, batch=64):
+    """
+    For float64 (the baseline) and every compact dtype: bytes per encoding,
+    gallery MB, top-1 agreement with float64, decision agreement at tolerance,
+    mean absolute distance error and per-query latency.
+    """
+    import tempfile
+    encodings = np.asarray(encodings, dtype=np.float64)
+    queries = np.asarray(queries, dtype=np.float64)
+    sq_norms = np.einsum('ij,ij->i', encodings, encodings)
+    rows = [{'dtype': 'float64', 'bytes_per_encoding': float(ENCODING_DIM * 8), 'gallery_mb': encodings.nbytes / 2 ** 20,
+             'top1_agreement': 1.0, 'decision_agreement': 1.0, 'mean_abs_distance_error': 0.0, 'query_ms': None}]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        galleries = [QuantizedGallery(write_gallery(os.path.join(tmp, dtype), names, encodings, dtype))
+                     for dtype in dtypes]
+        top1, decision, error, elapsed = (np.zeros(len(dtypes)) for _ in range(4))
+        for start in range(0, len(queries), batch):
+            chunk = queries[start:start + batch]
+            base = _float64_distances(encodings, sq_norms, chunk)
+            base_top = base.argmin(axis=1)
+            base_accept = base[np.arange(len(chunk)), base_top] <= tolerance
+            for i, gallery in enumerate(galleries):
+                t0 = time.perf_counter()
+                dist = np.vstack([gallery.distances(q) for q in chunk])
+                elapsed[i] += time.perf_counter() - t0
+                top = dist.argmin(axis=1)
+                top1[i] += np.sum(top == base_top)
+                decision[i] += np.sum((dist[np.arange(len(chunk)), top] <= tolerance) == base_accept)
+                error[i] += np.abs(dist - base).mean(axis=1).sum()
+        n = len(queries)
+        for i, (dtype, gallery) in enumerate(zip(dtypes, galleries)):
+            rows.append({'dtype': dtype, 'bytes_per_encoding': gallery.nbytes / max(len(gallery), 1),
+                         'gallery_mb': gallery.nbytes / 2 ** 20, 'top1_agreement': float(top1[i] / n),
+                         'decision_agreement': float(decision[i] / n),
+                         'mean_abs_distance_error': float(error[i] / n), 'query_ms': float(elapsed[i] / n * 1000)})
+        del galleries
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compact memory-mapped galleries (float16 / int8).')
+    parser.add_argument('--db', default='./db')
+    sub = parser.add_subparsers(dest='command', required=True)
+    export = sub.add_parser('export', help='write db/.gallery.<dtype> from the encoding cache')
+    export.add_argument('--dtype', choices=DTYPES, default='int8')
+    export.add_argument('--out', help='gallery directory (default: db/.gallery.<dtype>)')
+    report = sub.add_parser('report', help='accuracy vs memory of each dtype against float64')
+    report.add_argument('--synthetic', type=int, default=0, help='use n synthetic encodings instead of the db')
+    report.add_argument('--queries', type=int, default=500)
+    report.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    if args.command == 'export' or not args.synthetic:
+        from encoding_store import EncodingStore
+        store = EncodingStore(args.db)
+        store.sync()
+
+    if args.command == 'export':
+        path = export_store(store, args.dtype, args.out)
+        gallery = QuantizedGallery(path)
+        print('Wrote {} encodings to {} ({:.1f} MB, {} bytes per encoding)'.format(
+            len(gallery), path, gallery.nbytes / 2 ** 20, gallery.nbytes // max(len(gallery), 1)))
+        return
+
+    rng = np.random.default_rng(0)
+    if args.synthetic:
+        from bench_ann import synthetic_gallery
+        encodings = synthetic_gallery(args.synthetic).astype(np.float64)
+        names = ['id_{}'.format(i) for i in range(len(encodings))]
+    else:
+        encodings, names = np.asarray(store.encodings()), store.names()
+    if len(encodings) == 0:
+        parser.error('no encodings to report on')
+    targets = rng.integers(0, len(encodings), size=args.queries)
+    queries = encodings[targets] + rng.normal(scale=0.02, size=(args.queries, ENCODING_DIM))
+
+    print('{:>8} {:>10} {:>10} {:>8} {:>9} {:>11} {:>9}'.format(
+        'dtype', 'bytes/enc', 'MB', 'top-1', 'decision', 'dist error', 'query ms'))
+    for row in accuracy_report(encodings, names, queries, args.tolerance):
+        print('{:>8} {:>10.0f} {:>10.1f} {:>8.4f} {:>9.4f} {:>11.5f} {:>9}'.format(
+            row['dtype'], row['bytes_per_encoding'], row['gallery_mb'], row['top1_agreement'],
+            row['decision_agreement'], row['mean_abs_distance_error'],
+            '-' if row['query_ms'] is None else '{:.2f}'.format(row['query_ms'])))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+import sys
+import csv
+import json
+import sqlite3
+import datetime
+import argparse
+from attendance import AttendanceStore
+
+ROLLUP_CHUNK = 50000  # attendance rows folded into the rollups per transaction
+DEFAULT_LATE_AFTER = '09:00'
+
+
+class Reports:
+    """
+    Attendance reports over a materialized daily rollup: one row per
+    (day, person) with first-in, last-out and punch count, kept next to the
+    punches in the same SQLite file. refresh() folds only punches added since
+    the last run (tracked by row id), ROLLUP_CHUNK rows per transaction, so a
+    month's report never rescans the whole history. Reports stream rows from
+    the rollup ordered by an index and keep at most one group in memory.
+    """
+    def __init__(self, path):
+        AttendanceStore(path).close()  # make sure the punch table exists
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        with self._conn:
+            self._conn.execute('CREATE TABLE IF NOT EXISTS daily_rollup ('
+                               'day TEXT NOT NULL, name TEXT NOT NULL, first_in TEXT NOT NULL, '
+                               'last_out TEXT NOT NULL, punches INTEGER NOT NULL, PRIMARY KEY (day, name))')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_rollup_name_day ON daily_rollup(name, day)')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS rollup_state (key TEXT PRIMARY KEY, value INTEGER)')
+
+    def _watermark(self):
+        row = self._conn.execute("SELECT value FROM rollup_state WHERE key = 'last_id'").fetchone()
+        return row[0] if row else 0
+
+    def refresh(self, chunk=ROLLUP_CHUNK):
+        """Folds punches added since the last refresh into the daily rollup. Returns the number folded."""
+        folded = 0
+        last_id = self._watermark()
+        max_id = self._conn.execute('SELECT COALESCE(MAX(id), 0) FROM attendance').fetchone()[0]
+        while last_id < max_id:
+            upper = min(last_id + chunk, max_id)
+            with self._conn:
+                cursor = self._conn.execute(
+                    'INSERT INTO daily_rollup (day, name, first_in, last_out, punches) '
+                    'SELECT substr(ts, 1, 10), name, MIN(ts), MAX(ts), COUNT(*) FROM attendance '
+                    'WHERE id > ? AND id <= ? GROUP BY substr(ts, 1, 10), name '
+                    'ON CONFLICT (day, name) DO UPDATE SET '
+                    'first_in = MIN(first_in, excluded.first_in), last_out = MAX(last_out, excluded.last_out), '
+                    'punches = punches + excluded.punches', (last_id, upper))
+                self._conn.execute("INSERT OR REPLACE INTO rollup_state (key, value) VALUES ('last_id', ?)", (upper,))
+            folded += cursor.rowcount
+            last_id = upper
+        return folded
+
+    def rebuild(self):
+        """Drops the rollup and folds the whole history again."""
+        with self._conn:
+            self._conn.execute('DELETE FROM daily_rollup')
+            self._conn.execute("DELETE FROM rollup_state WHERE key = 'last_id'")
+        return self.refresh()
+
+    def _rows(self, start, end, name=None, order='day, name'):
+        sql = 'SELECT day, name, first_in, last_out, punches FROM daily_rollup WHERE day >= ? AND day < ?'
+        params = [start.isoformat(), end.isoformat()]
+        if name is not None:
+            sql += ' AND name = ?'
+            params.append(name)
+        return self._conn.execute(sql + ' ORDER BY ' + order, params)
+
+    def daily(self, start, end, name=None):
+        """Per-person first-in/last-out for every day in [start, end)."""
+        for day, person, first_in, last_out, punches in self._rows(start, end, name):
+            yield {'day': day, 'name': person, 'first_in': first_in[11:], 'last_out': last_out[11:],
+                   'punches': punches}
+
+    def weekly(self, start, end, name=None):
+        """Per-person ISO-week summaries: days present, earliest in, latest out, average first-in."""
+        group = None
+        for day, person, first_in, last_out, punches in self._rows(start, end, name, order='name, day'):
+            year, week, _ = datetime.date.fromisoformat(day).isocalendar()
+            key = (person, '{}-W{:02d}'.format(year, week))
+            if group is not None and group['key'] != key:
+                yield _finish_week(group)
+                group = None
+            if group is None:
+                group = {'key': key, 'days': 0, 'first_in': first_in[11:], 'last_out': last_out[11:],
+                         'in_seconds': 0, 'punches': 0}
+            group['days'] += 1
+            group['first_in'] = min(group['first_in'], first_in[11:])
+            group['last_out'] = max(group['last_out'], last_out[11:])
+            group['in_seconds'] += _seconds(first_in[11:])
+            group['punches'] += punches
+        if group is not None:
+            yield _finish_week(group)
+
+    def late(self, start, end, after=DEFAULT_LATE_AFTER, name=None):
+        """Days in [start, end) whose first punch is later than after (HH:MM)."""
+        limit = _seconds(after)
+        for row in self.daily(start, end, name):
+            minutes = (_seconds(row['first_in']) - limit) / 60.0
+            if minutes > 0:
+                yield {'day': row['day'], 'name': row['name'], 'first_in': row['first_in'],
+                       'minutes_late': round(minutes, 1)}
+
+    def headcount(self, start, end, period='day'):
+        """Distinct people present per day, ISO week or month."""
+        if period == 'day':
+            rows = self._conn.execute('SELECT day, COUNT(*) FROM daily_rollup WHERE day >= ? AND day < ? '
+                                      'GROUP BY day ORDER BY day',
+                                      (start.isoformat(), end.isoformat()))
+            for day, count in rows:
+                yield {'period': day, 'headcount': count}
+            return
+
+        current, names = None, set()
+        for day, person, _, _, _ in self._rows(start, end):
+            date = datetime.date.fromisoformat(day)
+            if period == 'week':
+                year, week, _ = date.isocalendar()
+                key = '{}-W{:02d}'.format(year, week)
+            else:
+                key = day[:7]
+            if key != current:
+                if current is not None:
+                    yield {'period': current, 'headcount': len(names)}
+                current, names = key, set()
+            names.add(person)
+        if current is not None:
+            yield {'period': current, 'headcount': len(names)}
+
+    def close(self):
+        self._conn.close()
+
+
+def _seconds(hhmmss):
+    parts = [int(p) for p in hhmmss.split(':')]
+    return parts[0] * 3600 + parts[1] * 60 + (parts[2] if len(parts) > 2 else 0)
+
+
+def _finish_week(group):
+    name, week = group['key']
+    mean = group['in_seconds'] // group['days']
+    return {'week': week, 'name': name, 'days_present': group['days'], 'first_in': group['first_in'],
+            'last_out': group['last_out'], 'avg_first_in': '{:02d}:{:02d}'.format(mean // 3600, mean % 3600 // 60),
+            'punches': group['punches']}
+
+
+def write_csv(rows, f):
+    """Streams report rows as CSV; the header comes from the first row. Returns the row count."""
+    writer = None
+    count = 0
+    for row in rows:
+        if writer is None:
+            writer = csv.DictWriter(f, fieldnames=list(row))
+            writer.writeheader()
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def write_json(rows, f):
+    """Streams report rows as a JSON array. Returns the row count."""
+    count = 0
+    f.write('[')
+    for row in rows:
+        f.write(',\n ' if count else '\n ')
+        f.write(json.dumps(row))
+        count += 1
+    f.write('\n]\n' if count else ']\n')
+    return count
+
+
+def parse_range(start=None, end=None, month=None):
+    """[start, end) dates from ISO dates or a YYYY-MM month; open ends cover all history."""
+    if month is not None:
+        first = datetime.datetime.strptime(month, '%Y-%m').date()
+        following = (first.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+        return first, following
+    return (datetime.date.fromisoformat(start) if start else datetime.date.min,
+            datetime.date.fromisoformat(end) if end else datetime.date.max)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Attendance reports from materialized daily rollups.')
+    parser.add_argument('--db', default='./attendance.db')
+    sub = parser.add_subparsers(dest='command', required=True)
+    refresh = sub.add_parser('refresh', help='fold new punches into the daily rollup')
+    refresh.add_argument('--rebuild', action='store_true', help='drop the rollup and rebuild it from all punches')
+    for command, help_text in (('daily', 'per-person first-in/last-out per day'),
+                               ('weekly', 'per-person summaries per ISO week'),
+                               ('late', 'late arrivals'),
+                               ('headcount', 'distinct people present over time')):
+        report = sub.add_parser(command, help=help_text)
+        report.add_argument('--start', help='first day (YYYY-MM-DD)')
+        report.add_argument('--end', help='day after the last one (YYYY-MM-DD)')
+        report.add_argument('--month', help='a whole month (YYYY-MM) instead of --start/--end')
+        report.add_argument('--format', choices=('csv', 'json'), default='csv')
+        report.add_argument('--output', help='file to write (default: stdout)')
+        if command == 'headcount':
+            report.add_argument('--period', choices=('day', 'week', 'month'), default='day')
+        else:
+            report.add_argument('--name', help='only this person')
+        if command == 'late':
+            report.add_argument('--after', default=DEFAULT_LATE_AFTER, help='expected arrival (HH:MM)')
+    args = parser.parse_args()
+
+    reports = Reports(args.db)
+    if args.command == 'refresh':
+        folded = reports.rebuild() if args.rebuild else reports.refresh()
+        print('Daily rollup updated ({} day/person rows touched)'.format(folded))
+        reports.close()
+        return
+
+    reports.refresh()
+    start, end = parse_range(args.start, args.end, args.month)
+    if args.command == 'headcount':
+        rows = reports.headcount(start, end, args.period)
+    elif args.command == 'late':
+        rows = reports.late(start, end, args.after, args.name)
+    else:
+        rows = getattr(reports, args.command)(start, end, args.name)
+
+    write = write_csv if args.format == 'csv' else write_json
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            count = write(rows, f)
+        print('Wrote {} rows to {}'.format(count, args.output))
+    else:
+        write(rows, sys.stdout)
+    reports.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,312 @@
+import os
+import json
+import time
+import argparse
+import datetime
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+import numpy as np
+import cv2
+import ann
+import util
+import enroll
+import metrics
+import attendance
+from batching import EncodeBatcher
+from encoding_store import EncodingStore
+from matcher import Matcher
+
+MAX_BODY = 16 * 1024 * 1024  # bytes
+MAX_DETECT_SIDE = 640        # frames are downscaled so their longer side is at most this before detection
+
+
+class Overloaded(Exception):
+    pass
+
+
+class BadRequest(Exception):
+    pass
+
+
+class Admission:
+    """
+    Bounded concurrency with a bounded wait: at most limit requests run at
+    once, at most max_waiting wait for a slot (each for up to timeout
+    seconds), and anything beyond that is rejected immediately.
+    """
+    def __init__(self, limit=4, max_waiting=16, timeout=2.0):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.running = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._cond = threading.Condition()
+
+    def __enter__(self):
+        with self._cond:
+            if self.running >= self.limit:
+                if self.waiting >= self.max_waiting:
+                    self.rejected += 1
+                    raise Overloaded()
+                self.waiting += 1
+                try:
+                    deadline = time.monotonic() + self.timeout
+                    while self.running >= self.limit:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.rejected += 1
+                            raise Overloaded()
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.running += 1
+        return self
+
+    def __exit__(self, *exc):
+        with self._cond:
+            self.running -= 1
+            self._cond.notify()
+        return False
+
+
+def decode_frame(body, content_type, query):
+    """
+    BGR image from a request body: a JPEG/PNG upload, or a raw frame
+    (application/octet-stream with width, height and optional format=bgr|rgb|gray).
+    """
+    if content_type == 'application/octet-stream':
+        try:
+            width, height = int(query['width'][0]), int(query['height'][0])
+        except (KeyError, ValueError):
+            raise BadRequest('raw frames need width and height query parameters')
+        fmt = query.get('format', ['bgr'])[0]
+        channels = 1 if fmt == 'gray' else 3
+        if len(body) != width * height * channels:
+            raise BadRequest('expected {} bytes for a {}x{} {} frame'.format(width * height * channels, width, height, fmt))
+        frame = np.frombuffer(body, dtype=np.uint8).reshape(height, width, channels)
+        if fmt == 'rgb':
+            return cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+        if fmt == 'gray':
+            return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+        return frame
+    frame = cv2.imdecode(np.frombuffer(body, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise BadRequest('body is not a decodable image')
+    return frame
+
+
+class RecognitionService:
+    """
+    Gallery, encoder and attendance store shared by all HTTP handler threads.
+    Descriptor extraction goes through one EncodeBatcher, so concurrent
+    identify requests are encoded together. Gallery writes (enroll/remove)
+    run one at a time on a single worker.
+    """
+    def __init__(self, db_path='./db', attendance_path='./attendance.db', tolerance=0.6, strategy='min',
+                 max_batch_size=16, max_wait=0.01, limit=4, max_waiting=16, timeout=2.0):
+        self.tolerance = tolerance
+        self.store = EncodingStore(db_path)
+        self.store.sync()
+        self.matcher = Matcher(self.store.encodings(), self.store.names(), strategy=strategy)
+        ann.attach_index(self.matcher, db_path)
+        metrics.set_gauge('gallery_size', len(self.matcher))
+
+        self.attendance = attendance.open_store(attendance_path)
+        self.attendance_writer = attendance.AttendanceWriter(self.attendance)
+        self.attendance_writer.start()
+        self.encoder = EncodeBatcher(max_batch_size, max_wait)
+        self.encoder.start()
+        self.gallery_jobs = ThreadPoolExecutor(max_workers=1)
+        self.admission = Admission(limit, max_waiting, timeout)
+        self.started = time.time()
+
+    def identify(self, frame, clock_in=False):
+        scale = min(1.0, MAX_DETECT_SIDE / max(frame.shape[:2]))
+        with self.admission:
+            rgb_small_frame, face_locations = util.detect_faces(frame, scale)
+            with metrics.timer('encode'):
+                encodings = self.encoder.encode(rgb_small_frame, face_locations)
+            with metrics.timer('match'):
+                matches = self.matcher.match(encodings, self.tolerance)
+
+        faces = []
+        for (top, right, bottom, left), match in zip(face_locations, matches):
+            metrics.inc('faces_recognized' if match.name is not None else 'faces_unknown')
+            faces.append({'box': [int(top / scale), int(right / scale), int(bottom / scale), int(left / scale)],
+                          'name': match.name, 'distance': match.distance, 'margin': match.margin})
+            if clock_in and match.name is not None:
+                self.attendance_writer.submit(match.name)
+        return faces
+
+    def enroll(self, name, frame):
+        reason = enroll.check_name(name)
+        if reason is not None:
+            raise BadRequest(reason)
+        # Enrollment is the heaviest request (detection, landmarks, encoding, a file
+        # write), so it takes an admission slot like identify
+        with self.admission:
+            added, reason = self.gallery_jobs.submit(enroll.add_photo, self.store, self.matcher, name, frame).result()
+        metrics.set_gauge('gallery_size', len(self.matcher))
+        return {'name': name, 'added_template': added, 'rejected': reason,
+                'templates': self.matcher.templates(name)}
+
+    def remove(self, name):
+        with self.admission:
+            removed = self.gallery_jobs.submit(enroll.remove_person, self.store, self.matcher, name).result()
+        metrics.set_gauge('gallery_size', len(self.matcher))
+        return {'name': name, 'removed': removed}
+
+    def attendance_records(self, query):
+        def parse(key):
+            value = query.get(key, [None])[0]
+            if value is None:
+                return None
+            try:
+                return datetime.datetime.fromisoformat(value)
+            except ValueError:
+                raise BadRequest('{} must be an ISO date or datetime'.format(key))
+
+        name, start, end = query.get('name', [None])[0], parse('start'), parse('end')
+        if name is not None:
+            punches = self.attendance.for_person(name, start, end)
+        elif start is not None or end is not None:
+            punches = self.attendance.between(start or datetime.datetime.min, end or datetime.datetime.max)
+        else:
+            try:
+                limit = int(query.get('n', ['25'])[0])
+            except ValueError:
+                raise BadRequest('n must be an integer')
+            punches = self.attendance.recent(limit)
+        return [{'name': n, 'time': when.strftime(attendance.TIMESTAMP_FORMAT)} for n, when in punches]
+
+    def health(self):
+        return {'gallery_size': len(self.matcher), 'identities': len(set(self.matcher.names)),
+                'running': self.admission.running, 'waiting': self.admission.waiting,
+                'rejected': self.admission.rejected, 'uptime_s': round(time.time() - self.started, 1)}
+
+    def close(self):
+        self.gallery_jobs.shutdown(wait=True)
+        self.encoder.stop()
+        self.attendance_writer.stop()
+
+
+class _ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _send_json(self, status, payload, headers=()):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in headers:
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY:
+            self.close_connection = True
+            raise BadRequest('body larger than {} bytes'.format(MAX_BODY))
+        return self.rfile.read(length)
+
+    def _dispatch(self, method):
+        service = self.server.service
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        parts = [unquote(p) for p in url.path.strip('/').split('/') if p]
+        start = time.perf_counter()
+        try:
+            # Always consume the body so the kept-alive connection stays in sync
+            body = self._body() if method == 'POST' else b''
+            content_type = self.headers.get('Content-Type', '')
+            if method == 'POST' and parts == ['identify']:
+                frame = decode_frame(body, content_type, query)
+                payload = {'faces': service.identify(frame, clock_in=query.get('clock_in', ['0'])[0] == '1')}
+            elif method == 'POST' and len(parts) == 2 and parts[0] == 'identities':
+                payload = service.enroll(parts[1], decode_frame(body, content_type, query))
+            elif method == 'DELETE' and len(parts) == 2 and parts[0] == 'identities':
+                payload = service.remove(parts[1])
+            elif method == 'GET' and parts == ['attendance']:
+                payload = {'punches': service.attendance_records(query)}
+            elif method == 'GET' and parts == ['health']:
+                payload = service.health()
+            else:
+                self._send_json(404, {'error': 'not found'})
+                return
+        except Overloaded:
+            metrics.inc('requests_rejected')
+            self._send_json(503, {'error': 'overloaded, retry later'}, [('Retry-After', '1')])
+            return
+        except BadRequest as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        except Exception:
+            # Keep the connection answered: a failure in dlib, encoding or a gallery job is a 500, not a reset
+            metrics.inc('requests_failed')
+            print('{} {} failed:'.format(method, self.path), flush=True)
+            traceback.print_exc()
+            self._send_json(500, {'error': 'internal error'})
+            return
+        metrics.observe('request', time.perf_counter() - start)
+        payload['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        self._send_json(200, payload)
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(service, host='127.0.0.1', port=8080):
+    server = ThreadingHTTPServer((host, port), _ApiHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless recognition service with a local HTTP API.')
+    parser.add_argument('--db', default='./db')
+    parser.add_argument('--attendance', default='./attendance.db')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--tolerance', type=float, default=0.6)
+    parser.add_argument('--strategy', choices=('min', 'centroid'), default='min')
+    parser.add_argument('--max-concurrency', type=int, default=os.cpu_count() or 4,
+                        help='identify requests processed at once')
+    parser.add_argument('--max-waiting', type=int, default=16, help='requests queued beyond that before 503s')
+    parser.add_argument('--queue-timeout', type=float, default=2.0, help='seconds a queued request may wait')
+    parser.add_argument('--batch-size', type=int, default=16, help='faces per encoding batch')
+    parser.add_argument('--batch-wait', type=float, default=0.01, help='seconds to wait for a batch to fill')
+    args = parser.parse_args()
+
+    metrics.configure_from_env()
+    service = RecognitionService(args.db, args.attendance, args.tolerance, args.strategy,
+                                 args.batch_size, args.batch_wait, args.max_concurrency,
+                                 args.max_waiting, args.queue_timeout)
+    server = serve(service, args.host, args.port)
+    print('Serving {} identities on http://{}:{}'.format(
+        len(set(service.matcher.names)), args.host, args.port), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == '__main__':
+    main()
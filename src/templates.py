@@ -0,0 +1,177 @@
+import os
+import time
+import argparse
+import numpy as np
+import cv2
+import metrics
+from encoding_store import EncodingStore, TEMPLATE_SEPARATOR
+
+MAX_TEMPLATES = 5
+AUTO_TAG = 'auto'
+
+
+def template_filename(name, tag, ext='.jpg'):
+    return '{}{}{}{}'.format(name, TEMPLATE_SEPARATOR, tag, ext)
+
+
+def unique_template_filename(db_path, name, tag, ext='.jpg'):
+    """template_filename(name, tag) with a counter appended until no file of that name exists in db_path."""
+    filename = template_filename(name, tag, ext)
+    n = 2
+    while os.path.exists(os.path.join(db_path, filename)):
+        filename = template_filename(name, '{}-{}'.format(tag, n), ext)
+        n += 1
+    return filename
+
+
+def is_harvested(filename):
+    return os.path.splitext(filename)[0].partition(TEMPLATE_SEPARATOR)[2].startswith(AUTO_TAG)
+
+
+def pairwise_distances(encodings):
+    encodings = np.asarray(encodings, dtype=np.float32)
+    sq = np.einsum('ij,ij->i', encodings, encodings)
+    d = sq[:, None] + sq[None, :] - 2.0 * (encodings @ encodings.T)
+    return np.sqrt(np.maximum(d, 0))
+
+
+def redundant_templates(encodings, cap, protected=()):
+    """
+    Indices to evict so that at most cap templates remain. The template closest
+    to its nearest neighbour (the least diverse one) goes first; protected
+    indices are only evicted once nothing else is left to evict.
+    """
+    n = len(encodings)
+    if n <= cap:
+        return []
+    d = pairwise_distances(encodings)
+    np.fill_diagonal(d, np.inf)
+    alive = np.ones(n, dtype=bool)
+    protected = np.isin(np.arange(n), list(protected))
+    evicted = []
+    while alive.sum() > cap:
+        nearest = np.where(alive[None, :], d, np.inf).min(axis=1)
+        candidates = alive & ~protected
+        if not candidates.any():
+            candidates = alive
+        victim = int(np.argmin(np.where(candidates, nearest, np.inf)))
+        alive[victim] = False
+        evicted.append(victim)
+    return evicted
+
+
+def enforce_cap(store, name, cap=MAX_TEMPLATES):
+    """
+    Deletes the least diverse templates of name beyond cap, preferring
+    harvested ones over enrollment captures. Returns the removed file names;
+    call store.save() afterwards.
+    """
+    files = [f for f in store.files_of(name) if store.entries[f].encoding is not None]
+    encodings = [store.entries[f].encoding for f in files]
+    protected = [i for i, f in enumerate(files) if not is_harvested(f)]
+    removed = [files[i] for i in redundant_templates(encodings, cap, protected)]
+    for filename in removed:
+        os.remove(os.path.join(store.db_path, filename))
+        del store.entries[filename]
+    return removed
+
+
+def spread_report(store):
+    """Per-identity intra-class spread of the templates in an EncodingStore, widest first."""
+    by_name = {}
+    for name, encoding in zip(store.names(), store.encodings()):
+        by_name.setdefault(name, []).append(encoding)
+
+    rows = []
+    for name, encodings in by_name.items():
+        encodings = np.asarray(encodings, dtype=np.float32)
+        centroid = encodings.mean(axis=0)
+        to_centroid = np.linalg.norm(encodings - centroid, axis=1)
+        pairs = pairwise_distances(encodings)[np.triu_indices(len(encodings), k=1)]
+        rows.append({'name': name, 'templates': len(encodings),
+                     'mean_pairwise': float(pairs.mean()) if len(pairs) else 0.0,
+                     'max_pairwise': float(pairs.max()) if len(pairs) else 0.0,
+                     'max_to_centroid': float(to_centroid.max())})
+    return sorted(rows, key=lambda r: r['max_pairwise'], reverse=True)
+
+
+class TemplateHarvester:
+    """
+    Adds live samples as extra templates. A face qualifies when its match is
+    confident (distance within max_distance, margin at least min_margin) but
+    not already covered by a template (distance at least min_novelty), at most
+    once per min_interval seconds per person.
+
+    offer() runs on the recognition thread and only checks; the file and
+    gallery update is handed to dispatch (e.g. a UI-thread queue).
+    """
+    def __init__(self, store, matcher, cap=MAX_TEMPLATES, max_distance=0.4, min_margin=0.1,
+                 min_novelty=0.2, min_interval=3600.0, dispatch=None):
+        self.store = store
+        self.matcher = matcher
+        self.cap = cap
+        self.max_distance = max_distance
+        self.min_margin = min_margin
+        self.min_novelty = min_novelty
+        self.min_interval = min_interval
+        self.dispatch = dispatch or (lambda func: func())
+        self.last_harvest = {}
+
+    def offer(self, match, encoding, rgb_image, location, now):
+        name = match.name
+        if name is None or not self.min_novelty <= match.distance <= self.max_distance:
+            return False
+        if match.margin < self.min_margin or now - self.last_harvest.get(name, float('-inf')) < self.min_interval:
+            return False
+        self.last_harvest[name] = now
+
+        top, right, bottom, left = location
+        pad = (bottom - top) // 2
+        height, width = rgb_image.shape[:2]
+        crop = rgb_image[max(top - pad, 0):min(bottom + pad, height), max(left - pad, 0):min(right + pad, width)]
+        crop = cv2.cvtColor(crop, cv2.COLOR_RGB2BGR)
+        self.dispatch(lambda: self._save(name, crop, encoding))
+        return True
+
+    def _save(self, name, bgr_crop, encoding):
+        filename = unique_template_filename(self.store.db_path, name, AUTO_TAG + time.strftime('%Y%m%d%H%M%S'))
+        cv2.imwrite(os.path.join(self.store.db_path, filename), bgr_crop)
+        self.store.put(filename, np.asarray(encoding, dtype=np.float64))
+        enforce_cap(self.store, name, self.cap)
+        self.store.save()
+        self.matcher.replace(name, self.store.templates(name))
+        metrics.inc('templates_harvested')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-identity template maintenance.')
+    parser.add_argument('--db', default='./db')
+    sub = parser.add_subparsers(dest='command', required=True)
+    spread = sub.add_parser('spread', help='report intra-class spread of every identity')
+    spread.add_argument('--warn', type=float, default=0.6, help='flag identities whose templates are this far apart')
+    prune = sub.add_parser('prune', help='evict the least diverse templates beyond --cap')
+    prune.add_argument('--cap', type=int, default=MAX_TEMPLATES)
+    args = parser.parse_args()
+
+    store = EncodingStore(args.db)
+    store.sync()
+    if args.command == 'spread':
+        rows = spread_report(store)
+        print('{:<24} {:>9} {:>10} {:>10} {:>10}'.format('identity', 'templates', 'mean', 'max', 'centroid'))
+        for row in rows:
+            flag = '  <- check labels' if row['max_pairwise'] > args.warn else ''
+            print('{:<24} {:>9} {:>10.3f} {:>10.3f} {:>10.3f}{}'.format(
+                row['name'], row['templates'], row['mean_pairwise'], row['max_pairwise'], row['max_to_centroid'], flag))
+        single = sum(row['templates'] == 1 for row in rows)
+        print('{} identities, {} with a single template'.format(len(rows), single))
+    else:
+        removed = []
+        for name in sorted(set(store.names())):
+            removed += enforce_cap(store, name, args.cap)
+        if removed:
+            store.save()
+        print('Evicted {} templates'.format(len(removed)))
+
+
+if __name__ == '__main__':
+    main()
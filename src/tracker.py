@@ -0,0 +1,277 @@
+import time
+import threading
+import numpy as np
+import cv2
+import metrics
+
+UNKNOWN = "Unknown"    # overlay label of a face with no gallery match
+NOT_LIVE = "Not live"  # overlay label of a matched face that failed the liveness check
+
+
+def iou(a, b):
+    """Intersection over union of two (top, right, bottom, left) boxes."""
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    inter = max(0.0, bottom - top) * max(0.0, right - left)
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 0.0
+
+
+def centroid_distance(a, b):
+    """Distance between box centres relative to the size of box a."""
+    ay, ax = (a[0] + a[2]) / 2.0, (a[1] + a[3]) / 2.0
+    by, bx = (b[0] + b[2]) / 2.0, (b[1] + b[3]) / 2.0
+    size = max(a[2] - a[0], a[1] - a[3], 1.0)
+    return ((ay - by) ** 2 + (ax - bx) ** 2) ** 0.5 / size
+
+
+class Track:
+    __slots__ = ('id', 'box', 'name', 'distance', 'margin', 'encoded_at', 'last_seen', 'misses', 'points', 'live')
+
+    def __init__(self, id, box, now):
+        self.id = id
+        self.box = box
+        self.name = None
+        self.distance = float('inf')
+        self.margin = 0.0
+        self.encoded_at = None
+        self.last_seen = now
+        self.misses = 0
+        self.points = None
+        self.live = None
+
+
+class FaceTracker:
+    """
+    Associates detections with tracks by IoU (falling back to centroid distance)
+    and keeps a stable track id -> identity binding. A track only needs a new
+    encoding when it is new, low-confidence or older than max_age seconds.
+    """
+    def __init__(self, iou_threshold=0.3, max_centroid_distance=0.5, max_age=5.0,
+                 max_misses=2, confident_distance=0.5):
+        self.iou_threshold = iou_threshold
+        self.max_centroid_distance = max_centroid_distance
+        self.max_age = max_age
+        self.max_misses = max_misses
+        self.confident_distance = confident_distance
+        self.tracks = []
+        self._next_id = 1
+
+    def update(self, boxes, now):
+        """
+        Associates detected boxes with tracks, starting tracks for new faces and
+        dropping tracks missed too often. Returns (track, box index) pairs for
+        the tracks that need encoding.
+        """
+        pairs = sorted(((iou(t.box, b), ti, bi) for ti, t in enumerate(self.tracks) for bi, b in enumerate(boxes)),
+                       reverse=True)
+        assigned_tracks, assigned_boxes = {}, set()
+        for score, ti, bi in pairs:
+            if score < self.iou_threshold:
+                break
+            if ti in assigned_tracks or bi in assigned_boxes:
+                continue
+            assigned_tracks[ti] = bi
+            assigned_boxes.add(bi)
+
+        # Fast movers can jump out of IoU range; try the closest centre instead
+        for ti, track in enumerate(self.tracks):
+            if ti in assigned_tracks:
+                continue
+            free = [(centroid_distance(track.box, boxes[bi]), bi) for bi in range(len(boxes)) if bi not in assigned_boxes]
+            if free:
+                dist, bi = min(free)
+                if dist <= self.max_centroid_distance:
+                    assigned_tracks[ti] = bi
+                    assigned_boxes.add(bi)
+
+        alive, detected = [], []
+        for ti, track in enumerate(self.tracks):
+            if ti in assigned_tracks:
+                bi = assigned_tracks[ti]
+                track.box = boxes[bi]
+                track.last_seen = now
+                track.misses = 0
+                track.points = None
+                alive.append(track)
+                detected.append((track, bi))
+            else:
+                track.misses += 1
+                if track.misses <= self.max_misses:
+                    alive.append(track)
+
+        for bi, box in enumerate(boxes):
+            if bi not in assigned_boxes:
+                track = Track(self._next_id, box, now)
+                self._next_id += 1
+                alive.append(track)
+                detected.append((track, bi))
+
+        self.tracks = alive
+        return [(t, bi) for t, bi in detected if self.needs_encoding(t, now)]
+
+    def needs_encoding(self, track, now):
+        return (track.encoded_at is None
+                or track.name is None
+                or track.distance > self.confident_distance
+                or now - track.encoded_at > self.max_age)
+
+    def assign(self, track, match, now):
+        """Binds a match result to a track."""
+        track.name = match.name
+        track.distance = match.distance
+        track.margin = match.margin
+        track.encoded_at = now
+
+    def propagate(self, prev_gray, gray, scale):
+        """
+        Moves every track by the median optical flow of corner points inside it,
+        so boxes follow faces between detections. Boxes are in full-frame
+        coordinates; the gray images are downscaled by scale.
+        """
+        for track in self.tracks:
+            top, right, bottom, left = (int(v * scale) for v in track.box)
+            if track.points is None:
+                mask = np.zeros_like(prev_gray)
+                mask[max(top, 0):max(bottom, 0), max(left, 0):max(right, 0)] = 255
+                track.points = cv2.goodFeaturesToTrack(prev_gray, maxCorners=20, qualityLevel=0.01,
+                                                       minDistance=3, mask=mask)
+            if track.points is None or len(track.points) == 0:
+                track.points = None
+                continue
+
+            moved, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, track.points, None)
+            good = status.reshape(-1) == 1
+            if not good.any():
+                track.points = None
+                continue
+            dx, dy = np.median((moved[good] - track.points[good]).reshape(-1, 2), axis=0) / scale
+            t, r, b, l = track.box
+            track.box = (t + dy, r + dx, b + dy, l + dx)
+            track.points = moved[good].reshape(-1, 1, 2)
+
+    def faces(self):
+        """Overlay tuples (top, right, bottom, left, name) for the live tracks."""
+        return [(int(t.box[0]), int(t.box[1]), int(t.box[2]), int(t.box[3]),
+                 UNKNOWN if t.name is None else NOT_LIVE if t.live is False else t.name)
+                for t in self.tracks]
+
+
+class TrackedRecognizer:
+    """
+    Detection + tracking front end for the recognition worker. Detection runs
+    on every call that sees motion (see AdaptiveDetector), but only faces whose
+    track needs it are encoded and matched, from the detector's ROI crops.
+    track() is the cheap in-between step that moves boxes with optical flow.
+    An EncodeBatcher can be passed as encoder to share descriptor batches, and
+    a TemplateHarvester as harvester to collect confident live samples.
+
+    With a LivenessGate as liveness, matched tracks are sampled on every
+    frame (detection and tracking alike) until they get a verdict, and a
+    match only counts once its track passed: until then identified() skips
+    it and on_recognized reports it without a name.
+
+    on_recognized, if set, is called after every detection cycle with the
+    (name, distance, margin) of each face seen in that cycle.
+    """
+    def __init__(self, matcher, tolerance=0.6, flow_scale=0.5, tracker=None, encoder=None, detector=None,
+                 harvester=None, liveness=None):
+        # Imported here: detector uses this module's iou()
+        from detector import AdaptiveDetector
+        self.matcher = matcher
+        self.encoder = encoder
+        self.harvester = harvester
+        self.liveness = liveness
+        self.detector = detector or AdaptiveDetector()
+        self.tolerance = tolerance
+        self.flow_scale = flow_scale
+        self.tracker = tracker or FaceTracker()
+        self.encodes = 0
+        self.on_recognized = None
+        self._prev_gray = None
+        self._lock = threading.Lock()
+        # Immutable (name, distance, last_seen) of the verified tracks, replaced
+        # after every update so identified() never waits for a recognition pass
+        self._identified = ()
+
+    def _gray(self, frame):
+        small = cv2.resize(frame, (0, 0), fx=self.flow_scale, fy=self.flow_scale)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def __call__(self, frame):
+        now = time.monotonic()
+        with self._lock:
+            tracked_boxes = [t.box for t in self.tracker.tracks]
+        detections = self.detector.detect(frame, tracked_boxes)
+        if detections is None:
+            # Static scene: the tracks still hold, nothing to re-detect
+            with self._lock:
+                self._prev_gray = self._gray(frame)
+                return self.tracker.faces()
+
+        with self._lock:
+            pending = self.tracker.update([d.box for d in detections], now)
+            if pending:
+                # Encode only new, low-confidence or stale tracks
+                items = [(detections[bi].image, [detections[bi].location]) for _, bi in pending]
+                with metrics.timer('encode'):
+                    if self.encoder is not None:
+                        encodings = [self.encoder.encode(image, locations)[0] for image, locations in items]
+                    else:
+                        # Imported here: batching loads dlib, which FaceTracker alone does not need
+                        from batching import encode_batch
+                        per_item, _ = encode_batch(items)
+                        encodings = [found[0] for found in per_item]
+                self.encodes += len(encodings)
+                with metrics.timer('match'):
+                    matches = self.matcher.match(encodings, self.tolerance)
+                for (track, _), match in zip(pending, matches):
+                    self.tracker.assign(track, match, now)
+                    metrics.inc('faces_recognized' if match.name is not None else 'faces_unknown')
+                if self.harvester is not None:
+                    # Only faces that already passed liveness may become templates
+                    for (track, _), (image, (location,)), match, encoding in zip(pending, items, matches, encodings):
+                        if self.liveness is None or track.live is True:
+                            self.harvester.offer(match, encoding, image, location, now)
+            if self.liveness is not None:
+                self.liveness.update(self.tracker.tracks, frame, now)
+            self._publish()
+            self._prev_gray = self._gray(frame)
+            seen = [(t.name if self._verified(t) else None, t.distance, t.margin)
+                    for t in self.tracker.tracks if t.misses == 0]
+            faces = self.tracker.faces()
+
+        if self.on_recognized is not None:
+            self.on_recognized(seen, now)
+        return faces
+
+    def _verified(self, track):
+        return track.name is not None and (self.liveness is None or track.live is True)
+
+    def _publish(self):
+        """Replaces the identified() snapshot; call with self._lock held."""
+        verified = [(t.name, t.distance, t.last_seen) for t in self.tracker.tracks if self._verified(t)]
+        self._identified = tuple(sorted(verified, key=lambda entry: entry[1]))
+
+    def identified(self, max_age=1.0):
+        """
+        Names of the currently tracked, identified (and, with a liveness gate,
+        live) faces seen within max_age seconds, best match first. Reads the
+        last published snapshot without taking the lock, so it is safe to call
+        from the UI thread while a recognition pass is running.
+        """
+        now = time.monotonic()
+        return [name for name, _, last_seen in self._identified if now - last_seen <= max_age]
+
+    def track(self, frame):
+        gray = self._gray(frame)
+        with self._lock:
+            if self._prev_gray is not None and self.tracker.tracks:
+                self.tracker.propagate(self._prev_gray, gray, self.flow_scale)
+                if self.liveness is not None:
+                    self.liveness.update(self.tracker.tracks, frame, time.monotonic())
+                    self._publish()
+            self._prev_gray = gray
+            return self.tracker.faces()
@@ -1,10 +1,15 @@
-import os
 import cv2
 import tkinter as tk
 from tkinter import messagebox
-import face_recognition
-import datetime
 import numpy as np
+from PIL import Image, ImageTk
+from matcher import Matcher
+import metrics
+import attendance
+
+# face_recognition (dlib and its model files), the encoding store and the
+# batch encoder are imported inside the functions that need them, so the UI
+# helpers here can be used before the models have loaded.
 
 
 def get_button(window, text, color, command, fg='white'):
@@ -92,6 +97,34 @@ class ToolTip:
             self.tooltip = None
 
 
+class PhotoBuffer:
+    """
+    RGBA array that shares memory with a PIL image and backs one Tk PhotoImage,
+    so showing a frame is a draw plus a paste instead of three new images.
+    """
+    def __init__(self):
+        self.array = None
+        self.photo = None
+        self._image = None
+
+    def get(self, width, height):
+        """The array to draw into; reallocated only when the size changes."""
+        if self.array is None or self.array.shape[:2] != (height, width):
+            self.array = np.empty((height, width, 4), dtype=np.uint8)
+            self._image = Image.frombuffer('RGBA', (width, height), self.array, 'raw', 'RGBA', 0, 1)
+            self.photo = None
+        return self.array
+
+    def show(self, label):
+        if self.photo is None:
+            self.photo = ImageTk.PhotoImage(image=self._image)
+        else:
+            self.photo.paste(self._image)
+        if getattr(label, 'imgtk', None) is not self.photo:
+            label.imgtk = self.photo
+            label.configure(image=self.photo)
+
+
 def get_entry_text(window):
     inputtxt = tk.Text(window,
                        height=1,
@@ -108,50 +141,68 @@ def msg_box(title, description):
 
 def recognize(img, known_face_encodings):
     """
-    Recognizes a face in an image given a list of known face encodings.
-    Returns the index of the first match or None.
+    Recognizes the faces in an image given a Matcher or a list of known face encodings.
+    Returns a list of (index of the best match or None, face location).
     """
     # Find all face encodings in the current frame
+    import face_recognition
     face_locations = face_recognition.face_locations(img)
     face_encodings = face_recognition.face_encodings(img, face_locations)
 
+    matcher = known_face_encodings
+    if not isinstance(matcher, Matcher):
+        matcher = Matcher(known_face_encodings)
+
+    # Score every face against the whole gallery in one batch
+    matches = matcher.match(face_encodings)
+    return [(match.index, face_location) for match, face_location in zip(matches, face_locations)]
+
+def detect_faces(frame, scale=0.2):
+    """Downscales a BGR frame and runs HOG detection. Returns (rgb_small_frame, face_locations)."""
+    import face_recognition
+    with metrics.timer('preprocess'):
+        small_frame = cv2.resize(frame, (0, 0), fx=scale, fy=scale)
+        rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+    with metrics.timer('detect'):
+        face_locations = face_recognition.face_locations(rgb_small_frame, model='hog')
+    return rgb_small_frame, face_locations
+
+
+def recognize_frames(frames, matcher, scale=0.2, tolerance=0.6, max_batch_size=64):
+    """
+    Detects, encodes and matches the faces in several BGR frames. Encoding runs
+    as one batch and all faces are matched in a single call.
+    Returns one list of (top, right, bottom, left, name) per frame, in full-frame coordinates.
+    """
+    from batching import encode_batch
+    detections = [detect_faces(frame, scale) for frame in frames]
+    with metrics.timer('encode'):
+        per_frame, _ = encode_batch(detections, max_batch_size)
+    with metrics.timer('match'):
+        matches = iter(matcher.match([e for encodings in per_frame for e in encodings], tolerance))
+
     results = []
-    for face_encoding, face_location in zip(face_encodings, face_locations):
-        matches = face_recognition.compare_faces(known_face_encodings, face_encoding)
-        name = "Unknown"
-
-        # Use the known face with the smallest distance to the new face
-        face_distances = face_recognition.face_distance(known_face_encodings, face_encoding)
-        if len(face_distances) > 0:
-            import numpy as np
-            best_match_index = np.argmin(face_distances)
-            if matches[best_match_index]:
-                results.append((best_match_index, face_location))
-            else:
-                results.append((None, face_location))
-        else:
-            results.append((None, face_location))
-            
+    for (_, face_locations), encodings in zip(detections, per_frame):
+        faces = []
+        for (top, right, bottom, left), _ in zip(face_locations, encodings):
+            match = next(matches)
+            name = match.name if match.name is not None else "Unknown"
+            metrics.inc('faces_recognized' if match.name is not None else 'faces_unknown')
+            faces.append((int(top / scale), int(right / scale), int(bottom / scale), int(left / scale), name))
+        results.append(faces)
     return results
 
-def load_db(db_path):
-    known_face_encodings = []
-    known_face_names = []
-
-    if not os.path.exists(db_path):
-        os.mkdir(db_path)
-
-    for filename in os.listdir(db_path):
-        if filename.endswith(".jpg") or filename.endswith(".png"):
-            path = os.path.join(db_path, filename)
-            image = face_recognition.load_image_file(path)
-            encodings = face_recognition.face_encodings(image)
-            if len(encodings) > 0:
-                known_face_encodings.append(encodings[0])
-                known_face_names.append(os.path.splitext(filename)[0])
-    
-    return known_face_encodings, known_face_names
 
-def log_attendance(name, log_path):
-    with open(log_path, 'a') as f:
-        f.write('{},{}\n'.format(name, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+def load_db(db_path):
+    """
+    Loads the known face encodings for the images in db_path.
+    Encodings are served from the on-disk cache; only new or changed images are encoded.
+    """
+    from encoding_store import EncodingStore
+    store = EncodingStore(db_path)
+    store.sync()
+    return store.encodings(), store.names()
+
+def log_attendance(name, db_path):
+    """Records a clock-in for name in the attendance store at db_path."""
+    attendance.open_store(db_path).record(name)
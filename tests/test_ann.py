@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from matcher import Matcher, ENCODING_DIM
+from ann import IVFIndex
+
+
+def clustered(n, clusters=16, seed=4):
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, ENCODING_DIM))
+    return (centres[rng.integers(clusters, size=n)] + rng.normal(scale=0.05, size=(n, ENCODING_DIM))).astype(np.float32)
+
+
+def indexed(encodings, names, n_lists=16, n_probe=16):
+    matcher = Matcher(encodings, names)
+    index = IVFIndex(n_lists=n_lists, n_probe=n_probe)
+    index.train(encodings)
+    matcher.set_index(index)
+    return matcher
+
+
+def test_probing_every_list_is_exact():
+    encodings = clustered(400)
+    names = list(range(400))
+    queries = encodings[::41] + 0.01
+    exact = Matcher(encodings, names).match(queries, tolerance=10.0)
+    approx = indexed(encodings, names).match(queries, tolerance=10.0)
+    assert [m.name for m in approx] == [m.name for m in exact]
+    assert [m.distance for m in approx] == pytest.approx([m.distance for m in exact], abs=1e-3)
+
+
+def test_index_follows_add_and_remove():
+    encodings = clustered(200)
+    names = ['p{}'.format(i) for i in range(200)]
+    matcher = indexed(encodings, names, n_probe=2)
+    matcher.remove('p5')  # swaps the last row into slot 5
+    assert matcher.match([encodings[5]], tolerance=0.01)[0].name is None
+    assert matcher.match([encodings[199]], tolerance=0.01)[0].name == 'p199'
+
+    matcher.add('new', encodings[5])
+    assert matcher.match([encodings[5]], tolerance=0.01)[0].name == 'new'
+    shortlisted = set(np.concatenate(matcher.index.shortlist(encodings[:50])).tolist())
+    assert shortlisted <= set(range(len(matcher)))
+
+
+def test_save_and_load_keep_the_quantizer(tmp_path):
+    encodings = clustered(200)
+    index = IVFIndex(n_lists=8, n_probe=3)
+    index.train(encodings)
+    path = str(tmp_path / 'ivf.npz')
+    index.save(path)
+    loaded = IVFIndex.load(path)
+    np.testing.assert_array_equal(loaded.centroids, index.centroids)
+    assert loaded.n_probe == 3 and loaded.n_lists == 8
@@ -0,0 +1,75 @@
+import sqlite3
+import datetime
+import threading
+from attendance import AttendanceStore, AttendanceWriter, parse_timestamp
+
+
+def at(text):
+    return datetime.datetime.strptime(text, '%Y-%m-%d %H:%M:%S')
+
+
+class FlakyStore:
+    """Records like a store but fails the first `failures` writes, as a locked database would."""
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.written = []
+        self.calls = 0
+
+    def record_many(self, punches):
+        self.calls += 1
+        if self.failures:
+            self.failures -= 1
+            raise sqlite3.OperationalError('database is locked')
+        self.written.extend(punches)
+
+
+def test_store_queries(tmp_path):
+    store = AttendanceStore(str(tmp_path / 'attendance.db'))
+    store.record_many([('ann', at('2026-03-02 08:55:00')), ('bob', at('2026-03-02 09:20:00')),
+                       ('ann', at('2026-03-03 09:05:00'))])
+    assert store.count() == 3
+    assert [name for name, _ in store.recent(2)] == ['ann', 'bob']
+    assert len(store.for_person('ann')) == 2
+    store.close()
+
+
+def test_parse_timestamp_accepts_legacy_formats():
+    assert parse_timestamp('2026-03-02 08:55:00') == at('2026-03-02 08:55:00')
+    assert parse_timestamp('2026-03-02 08:55:00.250000').microsecond == 250000
+    assert parse_timestamp('yesterday') is None
+
+
+def test_writer_batches_and_flushes_on_stop():
+    store = FlakyStore()
+    written = []
+    writer = AttendanceWriter(store, on_written=written.append)
+    for name in ('ann', 'bob', 'cat'):
+        writer.submit(name, at('2026-03-02 09:00:00'))
+    writer.start()  # everything queued before start goes out in one transaction
+    writer.stop()
+    assert not writer.is_alive()
+    assert [name for name, _ in store.written] == ['ann', 'bob', 'cat']
+    assert store.calls == 1 and len(written) == 1
+
+
+def test_writer_retries_a_failed_write():
+    store = FlakyStore(failures=2)
+    done = threading.Event()
+    writer = AttendanceWriter(store, on_written=lambda batch: done.set(), retry_delay=0.01)
+    writer.start()
+    writer.submit('ann')
+    assert done.wait(2.0)
+    assert writer.is_alive()
+    assert [name for name, _ in store.written] == ['ann'] and store.calls == 3
+
+    writer.submit('bob')
+    writer.stop()
+    assert [name for name, _ in store.written] == ['ann', 'bob']
+
+
+def test_writer_stops_even_if_the_last_write_fails():
+    writer = AttendanceWriter(FlakyStore(failures=100), retry_delay=0.01)
+    writer.start()
+    writer.submit('ann')
+    writer.stop()
+    assert not writer.is_alive()
@@ -0,0 +1,36 @@
+from autoattend import ClockInDebouncer
+
+
+def test_needs_k_of_last_m_confident_cycles():
+    debouncer = ClockInDebouncer(k=3, m=5)
+    seen = [('ann', 0.3, 0.2)]
+    assert debouncer.observe(seen, 0.0) == []
+    assert debouncer.observe([], 0.1) == []
+    assert debouncer.observe(seen, 0.2) == []
+    assert debouncer.observe(seen, 0.3) == ['ann']
+
+
+def test_hits_outside_the_window_do_not_count():
+    debouncer = ClockInDebouncer(k=2, m=2)
+    assert debouncer.observe([('ann', 0.3, 0.2)], 0.0) == []
+    assert debouncer.observe([], 0.1) == []
+    assert debouncer.observe([('ann', 0.3, 0.2)], 0.2) == []
+
+
+def test_unconfident_candidates_are_ignored():
+    debouncer = ClockInDebouncer(k=1, m=1, min_margin=0.05, max_distance=0.5)
+    assert debouncer.observe([('ann', 0.55, 0.2)], 0.0) == []  # too far
+    assert debouncer.observe([('ann', 0.3, 0.01)], 0.1) == []  # ambiguous
+    assert debouncer.observe([(None, 0.3, 0.2)], 0.2) == []    # unknown face
+    assert debouncer.observe([('ann', 0.5, 0.05)], 0.3) == ['ann']  # both limits are inclusive
+
+
+def test_cooldown_after_punch_and_suppress():
+    debouncer = ClockInDebouncer(k=1, m=1, cooldown=60.0)
+    assert debouncer.observe([('ann', 0.3, 0.2)], 0.0) == ['ann']
+    assert debouncer.observe([('ann', 0.3, 0.2)], 30.0) == []
+    assert debouncer.observe([('ann', 0.3, 0.2)], 61.0) == ['ann']
+
+    debouncer.suppress('bob', 100.0)  # clocked in with the button
+    assert debouncer.observe([('bob', 0.3, 0.2)], 120.0) == []
+    assert debouncer.observe([('bob', 0.3, 0.2)], 161.0) == ['bob']
@@ -0,0 +1,137 @@
+import numpy as np
+import pytest
+from liveness import (LIVE, SPOOF, BlinkCheck, LandmarkMotionCheck, LivenessGate, Sample, TextureCheck,
+                      PATCH_SIZE, LEFT_EYE, RIGHT_EYE)
+from tracker import Track
+
+
+def face_landmarks(eye_open=1.0):
+    """68 points roughly shaped like a face; eye_open scales the eye height."""
+    rng = np.random.default_rng(0)
+    points = rng.uniform(20, 130, size=(68, 2)).astype(np.float32)
+    for eye, x0 in ((LEFT_EYE, 40.0), (RIGHT_EYE, 90.0)):
+        xs = x0 + np.array([0, 7, 14, 21, 14, 7], dtype=np.float32)
+        ys = 60 + np.array([0, -5, -5, 0, 5, 5], dtype=np.float32) * eye_open
+        points[eye] = np.stack([xs, ys], axis=1)
+    return points
+
+
+def samples(landmarks, patch=None):
+    return [Sample(i * 0.1, points, patch) for i, points in enumerate(landmarks)]
+
+
+class Vote:
+    """A check that votes after a given number of samples."""
+    def __init__(self, vote, after, name='vote'):
+        self.vote, self.after, self.name = vote, after, name
+
+    def __call__(self, samples):
+        return self.vote if len(samples) >= self.after else None
+
+
+def gate(*checks, **kwargs):
+    liveness = LivenessGate(checks=checks, min_interval=0.0, **kwargs)
+    liveness._sample = lambda frame, box, now: Sample(now, None, None)
+    return liveness
+
+
+def matched_track(track_id=1, name='ann'):
+    track = Track(track_id, (0, 100, 100, 0), 0.0)
+    track.name = name
+    return track
+
+
+def test_blink_needs_a_close_and_reopen():
+    open_eyes, closed = face_landmarks(1.0), face_landmarks(0.3)
+    assert BlinkCheck()(samples([open_eyes] * 5)) is None
+    assert BlinkCheck()(samples([open_eyes, open_eyes, closed, open_eyes, open_eyes])) == LIVE
+    assert BlinkCheck()(samples([open_eyes, open_eyes, open_eyes, closed])) is None  # not reopened yet
+
+
+def test_motion_ignores_rigid_moves_of_a_flat_face():
+    points = face_landmarks()
+    shifted = [points * 1.1 + 5.0 for _ in range(4)]  # a photo moved and zoomed: a homography
+    assert LandmarkMotionCheck()(samples([points] + shifted)) is None
+
+    rng = np.random.default_rng(1)
+    moving = [points + rng.normal(scale=3.0, size=points.shape).astype(np.float32) for _ in range(4)]
+    assert LandmarkMotionCheck()(samples([points] + moving)) == LIVE
+
+
+def test_texture_flags_periodic_patterns():
+    yy, xx = np.mgrid[:PATCH_SIZE, :PATCH_SIZE]
+    moire = (128 + 100 * np.sin(xx * 2.6)).astype(np.uint8)
+    smooth = (128 + 40 * np.exp(-((yy - 32) ** 2 + (xx - 32) ** 2) / 400.0)).astype(np.uint8)
+    assert TextureCheck()(samples([None] * 4, moire)) == SPOOF
+    assert TextureCheck()(samples([None] * 4, smooth)) is None
+
+
+def test_unmatched_tracks_are_not_sampled():
+    liveness = gate(Vote(LIVE, 1))
+    track = matched_track(name=None)
+    liveness.update([track], None, 0.0)
+    assert track.live is None and liveness.verdicts == {} and liveness._pending == {}
+
+
+def test_live_vote_needs_min_samples_and_is_cached():
+    verdicts = []
+    liveness = gate(Vote(LIVE, 1), min_samples=3)
+    liveness.on_verdict = lambda name, verdict: verdicts.append((name, verdict.live, verdict.samples))
+    track = matched_track()
+    for i in range(2):
+        liveness.update([track], None, i * 0.1)
+        assert track.live is None
+    liveness.update([track], None, 0.2)
+    assert track.live is True and verdicts == [('ann', True, 3)]
+
+    liveness.update([track], None, 0.3)
+    assert track.live is True and len(verdicts) == 1  # decided once per track
+
+
+def test_spoof_vote_fails_at_once():
+    liveness = gate(Vote(LIVE, 1), Vote(SPOOF, 1, name='texture'), min_samples=1)
+    track = matched_track()
+    liveness.update([track], None, 0.0)
+    assert track.live is False and liveness.verdicts[track.id][1].reason == 'texture'
+
+
+def test_no_vote_fails_after_the_window():
+    liveness = gate(Vote(None, 1), window=1.0)
+    track = matched_track()
+    liveness.update([track], None, 0.0)
+    liveness.update([track], None, 0.9)
+    assert track.live is None
+    liveness.update([track], None, 1.1)
+    assert track.live is False
+
+
+def test_rematch_restarts_the_check():
+    liveness = gate(Vote(LIVE, 2), min_samples=2)
+    track = matched_track()
+    liveness.update([track], None, 0.0)
+    liveness.update([track], None, 0.1)
+    assert track.live is True
+
+    track.name = 'bob'  # re-encoded as someone else: ann's verdict must not carry over
+    liveness.update([track], None, 0.2)
+    assert track.live is None and track.id not in liveness.verdicts
+    liveness.update([track], None, 0.3)
+    assert track.live is True and liveness.verdicts[track.id][0] == 'bob'
+
+
+def test_dead_tracks_are_forgotten():
+    liveness = gate(Vote(LIVE, 1), min_samples=1)
+    first, second = matched_track(1), matched_track(2, 'bob')
+    liveness.update([first, second], None, 0.0)
+    assert set(liveness.verdicts) == {1, 2}
+    liveness.update([second], None, 0.1)
+    assert set(liveness.verdicts) == {2}
+
+
+def test_min_interval_limits_sampling():
+    liveness = gate(Vote(None, 100))
+    liveness.min_interval = 0.5
+    track = matched_track()
+    for now in (0.0, 0.1, 0.2, 0.6):
+        liveness.update([track], None, now)
+    assert len(liveness._pending[track.id].samples) == 2
@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+from matcher import Matcher, ENCODING_DIM
+
+
+def unit(*values):
+    """A 128-d encoding with the given leading components and zeros elsewhere."""
+    vector = np.zeros(ENCODING_DIM, dtype=np.float32)
+    vector[:len(values)] = values
+    return vector
+
+
+def brute_force(gallery, names, query):
+    """Per-identity best distance, the reference the matcher must agree with."""
+    best = {}
+    for name, encoding in zip(names, gallery):
+        d = float(np.linalg.norm(encoding - query))
+        best[name] = min(best.get(name, np.inf), d)
+    return sorted(best.items(), key=lambda item: item[1])
+
+
+def test_distances_match_numpy():
+    rng = np.random.default_rng(0)
+    gallery = rng.normal(size=(50, ENCODING_DIM)).astype(np.float32)
+    queries = rng.normal(size=(4, ENCODING_DIM)).astype(np.float32)
+    expected = np.linalg.norm(queries[:, None, :] - gallery[None, :, :], axis=2)
+    np.testing.assert_allclose(Matcher(gallery).distances(queries), expected, rtol=1e-4, atol=1e-4)
+
+
+def test_ranking_and_margin_agree_with_brute_force():
+    rng = np.random.default_rng(1)
+    gallery = rng.normal(scale=0.1, size=(60, ENCODING_DIM)).astype(np.float32)
+    names = ['p{}'.format(i % 20) for i in range(60)]  # three templates each
+    matcher = Matcher(gallery, names)
+    queries = gallery[[0, 7, 33]] + rng.normal(scale=0.01, size=(3, ENCODING_DIM)).astype(np.float32)
+    for query, match in zip(queries, matcher.match(queries, tolerance=10.0, k=3)):
+        expected = brute_force(gallery, names, query)
+        assert match.name == expected[0][0]
+        assert match.distance == pytest.approx(expected[0][1], abs=1e-4)
+        assert match.margin == pytest.approx(expected[1][1] - expected[0][1], abs=1e-4)
+        assert [name for name, _ in match.candidates] == [name for name, _ in expected[:3]]
+
+
+def test_tolerance_is_inclusive_and_unknown_keeps_distance():
+    matcher = Matcher([unit(0.0), unit(1.0)], ['ann', 'bob'])
+    inside, outside = matcher.match([unit(0.0, 0.5), unit(0.0, 0.7)], tolerance=0.5)
+    assert inside.name == 'ann' and inside.distance == pytest.approx(0.5)
+    assert outside.name is None and outside.index is None
+    assert outside.distance == pytest.approx(0.7)
+    assert outside.candidates[0][0] == 'ann'
+
+
+def test_single_identity_has_infinite_margin():
+    match = Matcher([unit(0.0), unit(0.1)], ['ann', 'ann']).match([unit(0.05)])[0]
+    assert match.name == 'ann'
+    assert match.margin == float('inf')
+    assert [name for name, _ in match.candidates] == ['ann']
+
+
+def test_empty_gallery_matches_nobody():
+    match = Matcher().match([unit(0.0)])[0]
+    assert match.name is None and match.distance == float('inf') and match.candidates == []
+
+
+def test_min_strategy_uses_closest_template():
+    # ann's templates straddle the query; bob sits between them and the query
+    matcher = Matcher([unit(0.0), unit(2.0), unit(0.7)], ['ann', 'ann', 'bob'], strategy='min')
+    match = matcher.match([unit(0.1)], tolerance=1.0)[0]
+    assert match.name == 'ann' and match.distance == pytest.approx(0.1)
+    assert match.margin == pytest.approx(0.5)
+
+
+def test_centroid_strategy_uses_mean_template():
+    matcher = Matcher([unit(0.0), unit(2.0), unit(0.7)], ['ann', 'ann', 'bob'], strategy='centroid')
+    match = matcher.match([unit(0.1)], tolerance=1.0)[0]
+    # ann's centroid is at 1.0, so bob (0.6 away) beats ann (0.9 away)
+    assert match.name == 'bob' and match.distance == pytest.approx(0.6)
+    assert match.margin == pytest.approx(0.3)
+
+
+def test_unknown_strategy_is_rejected():
+    with pytest.raises(ValueError):
+        Matcher(strategy='max')
+
+
+def test_add_remove_replace_in_place():
+    matcher = Matcher([unit(0.0), unit(1.0), unit(2.0)], ['ann', 'bob', 'cat'], capacity=2)
+    matcher.add('ann', unit(3.0))
+    assert len(matcher) == 4 and matcher.templates('ann') == 2
+
+    assert matcher.remove('ann') == 2
+    assert len(matcher) == 2 and sorted(matcher.names) == ['bob', 'cat']
+    assert matcher.match([unit(2.0)])[0].name == 'cat'
+    assert matcher.match([unit(0.0)], tolerance=0.5)[0].name is None
+
+    matcher.replace('bob', [unit(5.0), unit(6.0)])
+    assert matcher.templates('bob') == 2
+    assert matcher.match([unit(1.0)], tolerance=0.5)[0].name is None
+    assert matcher.match([unit(5.9)], tolerance=0.5)[0].name == 'bob'
+    assert matcher.remove('nobody') == 0
+
+
+def test_centroids_follow_mutations():
+    matcher = Matcher([unit(0.0), unit(2.0)], ['ann', 'bob'], strategy='centroid')
+    assert matcher.match([unit(0.0)])[0].name == 'ann'
+    matcher.add('ann', unit(4.0))  # ann's centroid moves to 2.0
+    match = matcher.match([unit(2.0)], tolerance=0.1)[0]
+    assert match.distance == pytest.approx(0.0) and match.margin == pytest.approx(0.0)
@@ -0,0 +1,115 @@
+import time
+import numpy as np
+import pytest
+import metrics
+from pipeline import DropOldestQueue, Frame, FrameRing, RecognitionWorker
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def ring_frame(ring, frame_id):
+    slot = ring.acquire()
+    ring.buffers[slot] = np.full((4, 4, 3), frame_id, dtype=np.uint8)
+    return Frame(frame_id, time.monotonic(), ring.buffers[slot], ring, slot)
+
+
+@pytest.fixture
+def worker_factory():
+    workers = []
+
+    def make(recognize_fn, **kwargs):
+        queue = DropOldestQueue(maxsize=1, on_drop=Frame.release)
+        worker = RecognitionWorker(queue, recognize_fn, duty_cycle=1.0, **kwargs)
+        workers.append(worker)
+        worker.start()
+        return queue, worker
+
+    yield make
+    for worker in workers:
+        worker.stop()
+        worker.join(timeout=1.0)
+
+
+def test_drop_oldest_queue_releases_what_it_drops():
+    dropped = []
+    queue = DropOldestQueue(maxsize=1, on_drop=dropped.append)
+    queue.put('a')
+    queue.put('b')
+    assert dropped == ['a'] and queue.dropped == 1
+    assert queue.get(timeout=0) == 'b'
+    assert queue.get(timeout=0.01) is None
+
+
+def test_frame_ring_reuses_released_slots():
+    ring = FrameRing(2)
+    first, second = ring.acquire(), ring.acquire()
+    assert ring.acquire() is None
+    ring.retain(first)
+    ring.release(first)
+    assert ring.acquire() is None  # still held once
+    ring.release(first)
+    assert ring.acquire() == first
+    ring.release(second)
+
+
+def test_worker_publishes_results_and_releases_frames(worker_factory):
+    ring = FrameRing(2)
+    queue, worker = worker_factory(lambda image: [int(image[0, 0, 0])])
+    queue.put(ring_frame(ring, 7))
+    assert wait_for(lambda: worker.result() is not None)
+    assert worker.result() == (7, [7])
+    assert wait_for(lambda: ring.refs == [0, 0])
+
+
+def test_worker_survives_recognition_errors(worker_factory):
+    metrics.registry.enabled = True
+    before = metrics.registry.counters.get('recognition_errors', 0)
+    ring = FrameRing(2)
+
+    def recognize(image):
+        if image[0, 0, 0] == 1:
+            raise ValueError('bad crop')
+        return ['ok']
+
+    try:
+        queue, worker = worker_factory(recognize)
+        queue.put(ring_frame(ring, 1))
+        assert wait_for(lambda: worker.errors == 1)
+        assert wait_for(lambda: ring.refs == [0, 0])  # the failed frame went back to the ring
+        queue.put(ring_frame(ring, 2))
+        assert wait_for(lambda: worker.result() == (2, ['ok']))
+        assert worker.is_alive()
+        assert metrics.registry.counters['recognition_errors'] == before + 1
+    finally:
+        metrics.registry.enabled = False
+
+
+def test_worker_survives_tracking_errors(worker_factory):
+    ring = FrameRing(3)
+    calls = []
+
+    def track(image):
+        calls.append(int(image[0, 0, 0]))
+        raise RuntimeError('flow failed')
+
+    def recognize(image):
+        time.sleep(0.05)  # leaves an idle window that track_fn fills
+        return ['ok']
+
+    queue, worker = worker_factory(recognize, track_fn=track)
+    worker.duty_cycle = 0.2
+    queue.put(ring_frame(ring, 1))
+    assert wait_for(lambda: worker.processed == 1)
+    queue.put(ring_frame(ring, 2))
+    assert wait_for(lambda: calls == [2])
+    assert wait_for(lambda: worker.errors == 1 and ring.refs == [0, 0, 0])
+    assert worker.is_alive()
+    queue.put(ring_frame(ring, 3))
+    assert wait_for(lambda: worker.processed == 2 or calls == [2, 3])
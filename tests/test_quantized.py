@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from matcher import Matcher, ENCODING_DIM
+from quantized import QuantizedGallery, quantize, write_gallery
+
+
+@pytest.fixture
+def gallery():
+    rng = np.random.default_rng(2)
+    encodings = rng.normal(scale=0.1, size=(300, ENCODING_DIM)).astype(np.float32)
+    names = ['p{}'.format(i // 2) for i in range(300)]  # two templates each
+    queries = encodings[::37] + rng.normal(scale=0.01, size=(len(encodings[::37]), ENCODING_DIM)).astype(np.float32)
+    return encodings, names, queries
+
+
+def test_int8_round_trip_error_is_within_half_a_step():
+    encodings = np.random.default_rng(3).normal(scale=0.1, size=(100, ENCODING_DIM)).astype(np.float32)
+    codes, scale, offset = quantize(encodings, 'int8')
+    assert codes.dtype == np.int8
+    assert np.all(np.abs(codes * scale + offset - encodings) <= scale / 2 + 1e-6)
+
+
+@pytest.mark.parametrize('dtype', ['float32', 'float16', 'int8'])
+def test_quantized_gallery_matches_float_matcher(tmp_path, gallery, dtype):
+    encodings, names, queries = gallery
+    quantized = QuantizedGallery(write_gallery(str(tmp_path / dtype), names, encodings, dtype))
+    exact = Matcher(encodings, names)
+    assert len(quantized) == len(exact) and list(quantized.names) == names
+    assert quantized.templates('p0') == 2
+    np.testing.assert_allclose(quantized.distances(queries), exact.distances(queries), atol=0.01)
+    assert [m.name for m in quantized.match(queries)] == [m.name for m in exact.match(queries)]
+
+
+def test_quantized_gallery_is_read_only(tmp_path, gallery):
+    encodings, names, _ = gallery
+    quantized = QuantizedGallery(write_gallery(str(tmp_path / 'g'), names, encodings))
+    with pytest.raises(TypeError):
+        quantized.add('new', encodings[0])
+    with pytest.raises(TypeError):
+        quantized.remove('p0')
+
+
+def test_unknown_dtype_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        write_gallery(str(tmp_path / 'g'), ['a'], np.zeros((1, ENCODING_DIM)), dtype='int4')
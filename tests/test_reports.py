@@ -0,0 +1,109 @@
+import datetime
+import sqlite3
+import pytest
+from attendance import AttendanceStore
+from reports import Reports, parse_range
+
+
+def at(text):
+    return datetime.datetime.strptime(text, '%Y-%m-%d %H:%M:%S')
+
+
+PUNCHES = [('ann', at('2026-03-02 08:55:00')), ('bob', at('2026-03-02 09:20:00')),
+           ('ann', at('2026-03-02 17:30:00')), ('ann', at('2026-03-03 09:05:00')),
+           ('bob', at('2026-03-03 08:40:00')), ('bob', at('2026-03-03 18:10:00'))]
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / 'attendance.db')
+    store = AttendanceStore(path)
+    yield path, store
+    store.close()
+
+
+def rollup(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute('SELECT day, name, first_in, last_out, punches FROM daily_rollup '
+                            'ORDER BY day, name').fetchall()
+
+
+def watermark(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT value FROM rollup_state WHERE key = 'last_id'").fetchone()[0]
+
+
+def test_refresh_builds_daily_rows(db):
+    path, store = db
+    store.record_many(PUNCHES)
+    reports = Reports(path)
+    assert reports.refresh() == 4
+    assert watermark(path) == len(PUNCHES)
+    assert rollup(path) == [('2026-03-02', 'ann', '2026-03-02 08:55:00', '2026-03-02 17:30:00', 2),
+                            ('2026-03-02', 'bob', '2026-03-02 09:20:00', '2026-03-02 09:20:00', 1),
+                            ('2026-03-03', 'ann', '2026-03-03 09:05:00', '2026-03-03 09:05:00', 1),
+                            ('2026-03-03', 'bob', '2026-03-03 08:40:00', '2026-03-03 18:10:00', 2)]
+    reports.close()
+
+
+def test_refresh_only_folds_new_punches(db):
+    path, store = db
+    store.record_many(PUNCHES[:3])
+    reports = Reports(path)
+    reports.refresh()
+    assert reports.refresh() == 0  # nothing new since the watermark
+
+    # A later punch extends an existing day; an earlier one arriving late moves first_in back
+    store.record_many(PUNCHES[3:] + [('ann', at('2026-03-02 19:00:00')), ('bob', at('2026-03-02 07:50:00'))])
+    assert reports.refresh() == 4
+    assert watermark(path) == len(PUNCHES) + 2
+    rows = {(day, name): (first_in, last_out, punches) for day, name, first_in, last_out, punches in rollup(path)}
+    assert rows[('2026-03-02', 'ann')] == ('2026-03-02 08:55:00', '2026-03-02 19:00:00', 3)
+    assert rows[('2026-03-02', 'bob')] == ('2026-03-02 07:50:00', '2026-03-02 09:20:00', 2)
+    reports.close()
+
+
+def test_chunked_incremental_refresh_matches_rebuild(db):
+    path, store = db
+    reports = Reports(path)
+    days = ['2026-03-{:02d}'.format(d) for d in range(1, 8)]
+    for batch in range(5):
+        store.record_many([(name, at('{} {:02d}:{:02d}:00'.format(day, 7 + (i + batch) % 11, (i * 7) % 60)))
+                           for i, (day, name) in enumerate((d, n) for d in days for n in ('ann', 'bob', 'cat'))])
+        reports.refresh(chunk=4)
+    incremental = rollup(path)
+    assert reports.rebuild() == len(incremental)
+    assert rollup(path) == incremental
+    assert watermark(path) == 5 * len(days) * 3
+    reports.close()
+
+
+def test_reports_read_the_rollup(db):
+    path, store = db
+    store.record_many(PUNCHES)
+    reports = Reports(path)
+    reports.refresh()
+    start, end = parse_range(month='2026-03')
+
+    daily = list(reports.daily(start, end, name='ann'))
+    assert [(row['day'], row['first_in'], row['last_out']) for row in daily] == [
+        ('2026-03-02', '08:55:00', '17:30:00'), ('2026-03-03', '09:05:00', '09:05:00')]
+
+    late = list(reports.late(start, end, after='09:00'))
+    assert [(row['day'], row['name'], row['minutes_late']) for row in late] == [
+        ('2026-03-02', 'bob', 20.0), ('2026-03-03', 'ann', 5.0)]
+
+    weekly = list(reports.weekly(start, end))
+    assert [(row['name'], row['week'], row['days_present'], row['punches']) for row in weekly] == [
+        ('ann', '2026-W10', 2, 3), ('bob', '2026-W10', 2, 3)]
+
+    assert list(reports.headcount(start, end)) == [{'period': '2026-03-02', 'headcount': 2},
+                                                  {'period': '2026-03-03', 'headcount': 2}]
+    assert list(reports.headcount(start, end, period='month')) == [{'period': '2026-03', 'headcount': 2}]
+    reports.close()
+
+
+def test_parse_range():
+    assert parse_range(month='2026-12') == (datetime.date(2026, 12, 1), datetime.date(2027, 1, 1))
+    assert parse_range('2026-03-01', '2026-03-08') == (datetime.date(2026, 3, 1), datetime.date(2026, 3, 8))
+    assert parse_range() == (datetime.date.min, datetime.date.max)
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+# templates imports the encoding store, which needs face_recognition/dlib
+templates = pytest.importorskip('templates', exc_type=ImportError)
+
+
+def test_under_cap_evicts_nothing():
+    assert templates.redundant_templates(np.eye(3, 128), cap=3) == []
+
+
+def test_least_diverse_template_goes_first():
+    encodings = np.zeros((4, 128))
+    encodings[:, 0] = [0.0, 0.05, 1.0, 2.0]  # rows 0 and 1 are near-duplicates
+    assert templates.redundant_templates(encodings, cap=3) in ([0], [1])
+    assert templates.redundant_templates(encodings, cap=3, protected=[0]) == [1]
+
+
+def test_protected_only_evicted_last():
+    encodings = np.zeros((3, 128))
+    encodings[:, 0] = [0.0, 0.05, 0.1]
+    assert sorted(templates.redundant_templates(encodings, cap=1, protected=[0, 1, 2])) in ([0, 1], [0, 2], [1, 2])
+    assert sorted(templates.redundant_templates(encodings, cap=1, protected=[1])) == [0, 2]
+
+
+def test_template_names_round_trip():
+    filename = templates.template_filename('john__doe', templates.AUTO_TAG + '1')
+    from encoding_store import identity_name
+    assert identity_name(filename) == 'john__doe'
+    assert templates.is_harvested(filename)
+    assert not templates.is_harvested('john__doe.jpg')
@@ -0,0 +1,102 @@
+from collections import namedtuple
+import pytest
+from tracker import FaceTracker, UNKNOWN, NOT_LIVE, centroid_distance, iou
+
+Match = namedtuple('Match', ['name', 'distance', 'margin'])
+
+
+def box(top, left, size=100):
+    return (top, left + size, top + size, left)
+
+
+def test_iou():
+    assert iou(box(0, 0), box(0, 0)) == pytest.approx(1.0)
+    assert iou(box(0, 0), box(0, 50)) == pytest.approx(1 / 3)
+    assert iou(box(0, 0), box(200, 200)) == 0.0
+
+
+def test_centroid_distance_is_relative_to_box_size():
+    assert centroid_distance(box(0, 0), box(0, 50)) == pytest.approx(0.5)
+
+
+def test_new_faces_start_tracks_that_need_encoding():
+    tracker = FaceTracker()
+    pending = tracker.update([box(0, 0), box(0, 300)], now=0.0)
+    assert [bi for _, bi in pending] == [0, 1]
+    assert [t.id for t in tracker.tracks] == [1, 2]
+
+
+def test_iou_match_keeps_identity_and_skips_encoding():
+    tracker = FaceTracker(confident_distance=0.5)
+    (track, _), = tracker.update([box(0, 0)], now=0.0)
+    tracker.assign(track, Match('ann', 0.3, 0.2), now=0.0)
+
+    assert tracker.update([box(5, 10)], now=1.0) == []  # same face, slightly moved
+    assert tracker.tracks == [track] and track.box == box(5, 10) and track.last_seen == 1.0
+    assert tracker.faces() == [(5, 110, 105, 10, 'ann')]
+
+
+def test_boxes_are_assigned_to_the_best_overlap():
+    tracker = FaceTracker()
+    tracker.update([box(0, 0), box(0, 120)], now=0.0)
+    left, right = tracker.tracks
+    tracker.update([box(0, 110), box(0, 10)], now=1.0)  # detection order swapped
+    assert left.box == box(0, 10) and right.box == box(0, 110)
+    assert len(tracker.tracks) == 2
+
+
+def test_centroid_fallback_for_fast_movers():
+    # A 40 px jump leaves IoU 0.43, below the threshold, but the centres are only 0.4 boxes apart
+    tracker = FaceTracker(iou_threshold=0.5, max_centroid_distance=0.5)
+    tracker.update([box(0, 0)], now=0.0)
+    track, = tracker.tracks
+    assert tracker.update([box(0, 40)], now=0.1) == [(track, 0)]
+    assert tracker.tracks == [track] and track.box == box(0, 40)
+
+    # 60 px further is 0.6 boxes away: a different face, and the old track starts missing
+    tracker.update([box(0, 100)], now=0.2)
+    assert [t.id for t in tracker.tracks] == [track.id, track.id + 1]
+    assert track.misses == 1
+
+
+def test_missed_tracks_expire_after_max_misses():
+    tracker = FaceTracker(max_misses=2)
+    tracker.update([box(0, 0)], now=0.0)
+    track, = tracker.tracks
+    tracker.update([], now=0.1)
+    tracker.update([], now=0.2)
+    assert tracker.tracks == [track] and track.misses == 2
+    tracker.update([], now=0.3)
+    assert tracker.tracks == []
+
+
+def test_a_detection_resets_misses():
+    tracker = FaceTracker(max_misses=1)
+    tracker.update([box(0, 0)], now=0.0)
+    track, = tracker.tracks
+    tracker.update([], now=0.1)
+    tracker.update([box(0, 0)], now=0.2)
+    tracker.update([], now=0.3)
+    assert tracker.tracks == [track]
+
+
+def test_needs_encoding():
+    tracker = FaceTracker(max_age=5.0, confident_distance=0.5)
+    (track, _), = tracker.update([box(0, 0)], now=0.0)
+    tracker.assign(track, Match('ann', 0.3, 0.2), now=0.0)
+    assert not tracker.needs_encoding(track, 4.0)
+    assert tracker.needs_encoding(track, 5.5)  # stale
+    tracker.assign(track, Match('ann', 0.55, 0.2), now=6.0)
+    assert tracker.needs_encoding(track, 6.1)  # low confidence
+    tracker.assign(track, Match(None, 0.7, 0.0), now=7.0)
+    assert tracker.needs_encoding(track, 7.1)  # unknown
+
+
+def test_faces_labels():
+    tracker = FaceTracker()
+    tracker.update([box(0, 0), box(0, 300), box(0, 600)], now=0.0)
+    unknown, live, spoof = tracker.tracks
+    tracker.assign(live, Match('ann', 0.3, 0.2), now=0.0)
+    tracker.assign(spoof, Match('bob', 0.3, 0.2), now=0.0)
+    spoof.live = False
+    assert [face[4] for face in tracker.faces()] == [UNKNOWN, 'ann', NOT_LIVE]